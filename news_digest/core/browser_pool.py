@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+DEFAULT_MAX_PAGES = 3
+# Bytes actually transferred for the document and everything it loaded
+TRANSFERRED_BYTES_JS = """() => performance.getEntriesByType("navigation")
+    .concat(performance.getEntriesByType("resource"))
+    .reduce((total, entry) => total + (entry.transferSize || 0), 0)"""
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class BrowserPool:
+    """
+    One headless Chromium shared by a whole run.
+
+    The Playwright driver and the browser are started on first use, so a
+    run that never needs a browser doesn't pay for launching one, and are
+    shut down when the context manager exits, also on errors. Every page()
+    gets its own fresh browser context, and at most max_pages are open at
+    once. If the browser crashes it is relaunched for the next page.
+
+    Requests for blocked_resource_types (images, fonts, ...) and, if
+    allowed_hosts is given, for hosts other than those and their subdomains
+    (ads, analytics, CDNs) are aborted before they leave the browser.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = DEFAULT_MAX_PAGES,
+        user_agent: str = DEFAULT_USER_AGENT,
+        allowed_hosts: Optional[Iterable[str]] = None,
+        blocked_resource_types: Iterable[str] = (),
+    ):
+        self.max_pages = max_pages
+        self.user_agent = user_agent
+        self.allowed_hosts = (
+            tuple(h.lower() for h in allowed_hosts) if allowed_hosts else None
+        )
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self._blocked: Dict[Any, int] = {}
+        self._semaphore = asyncio.Semaphore(max_pages)
+        self._start_lock = asyncio.Lock()
+        self._playwright: Optional[Any] = None
+        self._browser: Optional[Any] = None
+        self.launches = 0
+        self.pages_opened = 0
+
+    async def __aenter__(self) -> "BrowserPool":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get_browser(self):
+        async with self._start_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._playwright is None:
+                try:
+                    from playwright.async_api import async_playwright
+                except ImportError:
+                    raise Exception(
+                        "Playwright is not installed. Install with: pip install playwright && playwright install"
+                    )
+                self._playwright = await async_playwright().start()
+            print("Launching headless Chromium")
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            self.launches += 1
+            return self._browser
+
+    @contextlib.asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """A new page in a fresh browser context, closed afterwards."""
+        async with self._semaphore:
+            browser = await self._get_browser()
+            context = await browser.new_context(user_agent=self.user_agent)
+            self.pages_opened += 1
+            page = None
+            try:
+                page = await context.new_page()
+                self._blocked[page] = 0
+                if self.allowed_hosts is not None or self.blocked_resource_types:
+                    await page.route("**/*", self._route_handler(page))
+                yield page
+            finally:
+                self._blocked.pop(page, None)
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+
+    def is_allowed(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return False
+        if self.allowed_hosts is None or url.startswith(("data:", "blob:")):
+            return True
+        host = (urlparse(url).hostname or "").lower()
+        return any(
+            host == allowed or host.endswith("." + allowed)
+            for allowed in self.allowed_hosts
+        )
+
+    def _route_handler(self, page):
+        async def handle(route):
+            request = route.request
+            if self.is_allowed(request.url, request.resource_type):
+                await route.continue_()
+            else:
+                self._blocked[page] = self._blocked.get(page, 0) + 1
+                await route.abort()
+
+        return handle
+
+    async def metrics(self, page) -> Dict[str, int]:
+        """Bytes transferred by and requests blocked for a page() so far."""
+        try:
+            transferred = int(await page.evaluate(TRANSFERRED_BYTES_JS))
+        except Exception:
+            transferred = 0
+        return {"bytes": transferred, "blocked": self._blocked.get(page, 0)}
+
+    async def close(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+        if self.pages_opened:
+            print(
+                f"Browser pool: {self.pages_opened} page(s), {self.launches} launch(es)"
+            )
@@ -1,17 +1,54 @@
+import asyncio
 import os
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 import logging
 import json
 from typing import Dict, List, Optional, Any
+from urllib.parse import urlparse
 
-import requests
+import aiohttp
 import boto3
 from botocore.exceptions import ClientError
 
+from news_digest.core.browser_pool import (
+    DEFAULT_MAX_PAGES,
+    DEFAULT_USER_AGENT,
+    BrowserPool,
+)
+from news_digest.utils.rate_limit import get_rate_limiter
+from news_digest.utils.state import PersistentCache, load_state, save_state
+from news_digest.utils.sync_pool import run_sync
 from news_digest.utils.util import is_running_in_lambda
 
+# The player pages only need their own HTML and scripts
+DEFAULT_BROWSER_ALLOWED_HOSTS = ["365chess.com"]
+DEFAULT_BROWSER_BLOCKED_RESOURCE_TYPES = [
+    "image",
+    "media",
+    "font",
+    "stylesheet",
+    "websocket",
+    "manifest",
+]
+DEFAULT_PAGE_TIMEOUT_MS = 45000
+DEFAULT_GAMES_TABLE_TIMEOUT_MS = 10000
+# Rows of the games table _extract_recent_games() reads
+GAMES_TABLE_SELECTOR = "table.stable tbody tr"
+FETCH_METHODS_STATE_KEY = "chess/fetch_methods.json"
+# How often a host remembered as needing the browser is retried over HTTP
+DEFAULT_HTTP_RECHECK_HOURS = 24
+HTTP_TIMEOUT_SECONDS = 30
+RATING_CACHE_STATE_KEY = "chess/rating_history.json"
+DEFAULT_RATING_CACHE_MAX_ENTRIES = 1000
+# A new rating list may take a few days to show up in the API; until then
+# the previous month's history is refetched every rating_retry_hours
+DEFAULT_RATING_PUBLISH_GRACE_DAYS = 7
+DEFAULT_RATING_RETRY_HOURS = 12
+# How long a player's FIDE id is remembered for prefetching
+FIDE_ID_TTL_SECONDS = 180 * 86400
+
 
 async def gen_chess_players_digest(
     config: Dict[str, Any],
@@ -40,12 +77,63 @@ async def gen_chess_players_digest(
     # Track all current games for batch S3 update
     all_current_games = {}
 
-    for player in players:
+    # One browser for the whole run, shared by players fetched concurrently
+    max_pages = config.get("browser_max_pages", DEFAULT_MAX_PAGES)
+    semaphore = asyncio.Semaphore(config.get("max_concurrent_players", max_pages))
+
+    async def gen_limited(player):
+        async with semaphore:
+            return await _gen_player_digest(
+                config,
+                player,
+                all_processed_games.get(player, []),
+                s3_object_age,
+                fetcher,
+                rating_cache,
+            )
+
+    fetch_methods = await run_sync(
+        load_state, global_config, FETCH_METHODS_STATE_KEY, {}
+    )
+
+    browser_pool = BrowserPool(
+        max_pages=max_pages,
+        allowed_hosts=config.get(
+            "browser_allowed_hosts", DEFAULT_BROWSER_ALLOWED_HOSTS
+        ),
+        blocked_resource_types=config.get(
+            "browser_blocked_resource_types", DEFAULT_BROWSER_BLOCKED_RESOURCE_TYPES
+        ),
+    )
+    async with (
+        browser_pool as pool,
+        aiohttp.ClientSession(
+            headers={"User-Agent": DEFAULT_USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS),
+        ) as session,
+    ):
+        fetcher = PlayerPageFetcher(config, pool, session, fetch_methods)
+        rating_cache = RatingHistoryCache(global_config, config, session)
+        await rating_cache.load()
+        # Histories of players seen in earlier runs load alongside the pages
+        rating_cache.prefetch(players)
+        results = await asyncio.gather(
+            *[gen_limited(player) for player in players], return_exceptions=True
+        )
+        await rating_cache.close()
+    await rating_cache.save()
+    print(f"Player pages: {fetcher.stats()}")
+    if fetcher.methods_changed:
+        await run_sync(
+            save_state, global_config, FETCH_METHODS_STATE_KEY, fetch_methods
+        )
+
+    for player, result in zip(players, results):
         try:
+            if isinstance(result, BaseException):
+                raise result
             processed_game_ids = all_processed_games.get(player, [])
-            player_digest, current_game_ids = await _gen_player_digest(
-                config, player, processed_game_ids, s3_object_age
-            )
+            player_digest, current_game_ids = result
             res += player_digest
 
             # Store current game IDs for batch update
@@ -128,13 +216,15 @@ async def _gen_player_digest(
     player: str,
     processed_game_ids: List[str],
     s3_object_age: Optional[datetime],
+    fetcher: "PlayerPageFetcher",
+    rating_cache: "RatingHistoryCache",
 ) -> tuple[str, List[str]]:
     # Query 365chess.com
     # First, check if local/365chess/<player> exists
     # If no, fetch it from https://www.365chess.com/players/<player>
     # Save it to local/365chess/<player>
 
-    player_info_html = await _get_player_info(player)
+    player_info_html = await _get_player_info(player, fetcher)
 
     # Extract player information
     ratings = _extract_chess_ratings(player_info_html)
@@ -143,8 +233,9 @@ async def _gen_player_digest(
     # Try to get rating history from Chess Tools API if we have FIDE ID
     rating_history = None
     if fide_id:
+        rating_cache.remember_player(player, fide_id)
         try:
-            rating_history = _get_rating_history(fide_id)
+            rating_history = await rating_cache.get(fide_id)
         except Exception as e:
             print(
                 f"WARNING: Failed to fetch rating history for {player} (FIDE ID: {fide_id}): {str(e)}"
@@ -370,13 +461,20 @@ def _extract_recent_games(
     return games
 
 
-async def _fetch_with_playwright(url: str, player_name: str) -> str:
+async def _fetch_with_playwright(
+    config: Dict[str, Any], url: str, player_name: str, pool: BrowserPool
+) -> str:
     """
     Fetch player page using Playwright for JavaScript-rendered content.
 
+    Waits for the games table rather than for the page to finish loading;
+    the pool blocks the resources the page doesn't need for it.
+
     Args:
+        config: Source config, for timeouts
         url: URL to fetch
         player_name: Player name for logging
+        pool: Browser pool to get the page from
 
     Returns:
         str: HTML content of the page
@@ -385,91 +483,185 @@ async def _fetch_with_playwright(url: str, player_name: str) -> str:
         Exception: If Playwright fails to fetch the page
     """
     try:
-        from playwright.async_api import (
-            async_playwright,
-            TimeoutError as PlaywrightTimeoutError,
-        )
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
     except ImportError:
         raise Exception(
             "Playwright is not installed. Install with: pip install playwright && playwright install"
         )
 
-    browser = None
     try:
-        async with async_playwright() as p:
-            # Use chromium in headless mode
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                # Set a realistic user agent
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
-            page = await context.new_page()
-
-            # Try different loading strategies with increasing timeout
-            html_content = None
+        async with pool.page() as page:
+            start = time.perf_counter()
+            try:
+                await page.goto(
+                    url,
+                    wait_until="domcontentloaded",
+                    timeout=config.get("page_timeout_ms", DEFAULT_PAGE_TIMEOUT_MS),
+                )
+            except PlaywrightTimeoutError:
+                print(
+                    f"⚠ Page load timed out for {player_name}, continuing with what has loaded"
+                )
 
-            # Strategy 1: Try with 'domcontentloaded' (faster, less strict)
             try:
+                await page.wait_for_selector(
+                    GAMES_TABLE_SELECTOR,
+                    state="attached",
+                    timeout=config.get(
+                        "games_table_timeout_ms", DEFAULT_GAMES_TABLE_TIMEOUT_MS
+                    ),
+                )
+            except PlaywrightTimeoutError:
                 print(
-                    f"Attempting to fetch {player_name} with Playwright (domcontentloaded strategy)..."
+                    f"⚠ Games table not found, but continuing anyway for {player_name}"
                 )
-                await page.goto(url, wait_until="domcontentloaded", timeout=45000)
 
-                # Wait a bit for dynamic content to load
-                await page.wait_for_timeout(2000)
+            html_content = await page.content()
+            metrics = await pool.metrics(page)
+            print(
+                f"✓ Fetched {player_name} with Playwright in {time.perf_counter() - start:.1f}s, "
+                f"{metrics['bytes'] / 1024:.0f} KB transferred, "
+                f"{metrics['blocked']} request(s) blocked"
+            )
 
-                # Check if we have the main content
-                try:
-                    await page.wait_for_selector("table.table", timeout=5000)
-                    print(f"✓ Main content loaded for {player_name}")
-                except:
-                    print(
-                        f"⚠ Table not found immediately, but continuing anyway for {player_name}"
-                    )
+        # Validate we got something useful
+        if not html_content or len(html_content) < 100:
+            raise Exception(
+                f"Received empty or very short response ({len(html_content) if html_content else 0} chars)"
+            )
 
-                html_content = await page.content()
+        return html_content
 
-            except PlaywrightTimeoutError:
+    except Exception as e:
+        raise Exception(f"Playwright fetch failed: {str(e)}")
+
+
+def _has_player_page_markers(html_content: str) -> bool:
+    """
+    Whether a player page has what the digest reads from it: the games
+    table and at least one rating. Pages served without them need the
+    browser to render.
+    """
+    if not html_content:
+        return False
+    has_games_table = re.search(
+        r'<table[^>]*class="[^"]*\bstable\b', html_content, re.IGNORECASE
+    )
+    has_rating = re.search(r"<strong>ELO \w+:</strong>", html_content, re.IGNORECASE)
+    return bool(has_games_table and has_rating)
+
+
+class PlayerPageFetcher:
+    """
+    Fetches player pages with a plain HTTP GET when that's enough, and with
+    the browser only when it isn't.
+
+    The method that worked is remembered per host in fetch_methods (kept in
+    the state store between runs). For an "http" host the page is fetched
+    over HTTP and escalated to the browser only if it lacks the games table
+    or the ratings. A "browser" host goes straight to the browser, with HTTP
+    as the fallback, and is retried over HTTP every http_recheck_hours in
+    case the site no longer needs JavaScript.
+
+    Both methods wait for the shared per-host rate limiter before loading
+    a page.
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        pool: BrowserPool,
+        session: aiohttp.ClientSession,
+        fetch_methods: Dict[str, Dict[str, Any]],
+    ):
+        self.config = config
+        self.pool = pool
+        self.session = session
+        self.fetch_methods = fetch_methods
+        self.rate_limiter = get_rate_limiter()
+        self.recheck_seconds = (
+            config.get("http_recheck_hours", DEFAULT_HTTP_RECHECK_HOURS) * 3600
+        )
+        self.methods_changed = False
+        self.counts = {"http": 0, "browser": 0, "escalated": 0}
+
+    def stats(self) -> str:
+        return (
+            f"{self.counts['http']} over HTTP, {self.counts['browser']} with the browser "
+            f"({self.counts['escalated']} escalated from HTTP)"
+        )
+
+    def _remember(self, host: str, method: str):
+        current = self.fetch_methods.get(host, {})
+        if current.get("method") != method or method == "browser":
+            self.fetch_methods[host] = {"method": method, "since": time.time()}
+            self.methods_changed = True
+
+    def _prefers_http(self, host: str) -> bool:
+        remembered = self.fetch_methods.get(host)
+        if remembered is None or remembered["method"] == "http":
+            return True
+        return time.time() - remembered["since"] > self.recheck_seconds
+
+    async def _fetch_http(self, url: str) -> str:
+        await self.rate_limiter.acquire(url)
+        async with self.session.get(url) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    async def fetch(self, url: str, player: str) -> str:
+        host = urlparse(url).hostname or ""
+        http_content = None
+        http_error = None
+
+        if self._prefers_http(host):
+            start = time.perf_counter()
+            try:
+                http_content = await self._fetch_http(url)
+            except Exception as e:
+                http_error = e
+            if _has_player_page_markers(http_content):
                 print(
-                    f"⚠ domcontentloaded strategy timed out for {player_name}, trying load strategy..."
+                    f"✓ Fetched {player} over HTTP in {time.perf_counter() - start:.2f}s"
                 )
+                self.counts["http"] += 1
+                self._remember(host, "http")
+                return http_content
+            print(
+                f"HTTP page for {player} lacks the games table or ratings "
+                f"({http_error or 'markers missing'}), using the browser"
+            )
+            self.counts["escalated"] += 1
 
-                # Strategy 2: Try with 'load' (waits for load event)
+        try:
+            await self.rate_limiter.acquire(url)
+            html_content = await _fetch_with_playwright(
+                self.config, url, player, self.pool
+            )
+        except Exception as e:
+            if http_content is None and http_error is None:
+                # Browser-first host: fall back to plain HTTP
+                print(f"Playwright failed for {player}: {str(e)}, falling back to HTTP")
                 try:
-                    await page.goto(url, wait_until="load", timeout=60000)
-                    await page.wait_for_timeout(2000)
-                    html_content = await page.content()
-                    print(f"✓ Fetched with 'load' strategy for {player_name}")
-                except PlaywrightTimeoutError:
-                    # If even 'load' times out, just get whatever we have
-                    print(
-                        f"⚠ Load strategy also timed out for {player_name}, getting current content..."
-                    )
-                    html_content = await page.content()
-
-            # Clean up
-            await context.close()
-            await browser.close()
-
-            # Validate we got something useful
-            if not html_content or len(html_content) < 100:
-                raise Exception(
-                    f"Received empty or very short response ({len(html_content) if html_content else 0} chars)"
-                )
-
-            return html_content
+                    http_content = await self._fetch_http(url)
+                except Exception as req_e:
+                    http_error = req_e
+            if http_content:
+                self.counts["http"] += 1
+                return http_content
+            raise Exception(
+                f"Both Playwright and HTTP failed. Playwright: {str(e)}, HTTP: {str(http_error)}"
+            )
 
-    except Exception as e:
-        # Make sure browser is closed even on error
-        if browser:
-            try:
-                await browser.close()
-            except:
-                pass
-        raise Exception(f"Playwright fetch failed: {str(e)}")
+        self.counts["browser"] += 1
+        if http_content is not None or http_error is not None:
+            # Only a page the browser could render proves HTTP wasn't enough
+            if _has_player_page_markers(html_content):
+                self._remember(host, "browser")
+        return html_content
 
 
-async def _get_player_info(player: str) -> str:
+async def _get_player_info(player: str, fetcher: PlayerPageFetcher) -> str:
     sanitized_player = player.replace(" ", "_")
 
     # Try to read from local cache first
@@ -481,32 +673,12 @@ async def _get_player_info(player: str) -> str:
     url = f"https://www.365chess.com/players/{sanitized_player}"
     print(f"Fetching {player} from {url}")
 
-    html_content = None
-
-    # Try Playwright first
-    try:
-        html_content = await _fetch_with_playwright(url, player)
-        print(f"Successfully fetched {player} with Playwright")
-    except Exception as e:
-        print(f"Playwright failed for {player}: {str(e)}, falling back to requests")
-
-        # Fallback to requests
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            html_content = response.text
-            print(f"Successfully fetched {player} with requests")
-        except Exception as req_e:
-            raise Exception(
-                f"Both Playwright and requests failed. Playwright: {str(e)}, Requests: {str(req_e)}"
-            )
+    html_content = await fetcher.fetch(url, player)
 
     # Check if we got a valid response
     if not html_content or len(html_content) < 100:
         raise Exception(f"Received empty or very short response for {player}")
 
-    time.sleep(1)  # Rate limiting
-
     # Try to save to local cache
     if not _is_prod():
         # Ensure directory exists
@@ -517,65 +689,36 @@ async def _get_player_info(player: str) -> str:
     return html_content
 
 
-def _get_rating_history(fide_id: str) -> Optional[List[Dict[str, Any]]]:
+async def _get_rating_history(
+    fide_id: str, session: aiohttp.ClientSession
+) -> Optional[List[Dict[str, Any]]]:
     """
     Fetch player rating history from Chess Tools API.
 
     Args:
         fide_id: FIDE ID of the player
+        session: HTTP session to fetch with
 
     Returns:
         list: List of rating history entries or None if failed
     """
-    import json
-
-    # Try to read from local cache first
-    cache_file = f"local/rating_api/{fide_id}"
-    if not _is_prod() and os.path.exists(cache_file):
-        print(f"Reading rating history for FIDE ID {fide_id} from {cache_file}")
-        try:
-            with open(cache_file, "r", encoding="utf-8") as f:
-                cached_data = json.load(f)
-                return cached_data if isinstance(cached_data, list) else None
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"WARNING: Failed to read cache file {cache_file}: {str(e)}")
-            # Continue to fetch from API if cache read fails
-
     url = f"https://api.chesstools.org/fide/player_history/?fide_id={fide_id}"
     print(f"Fetching rating history from {url}")
 
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-
-        if response.status_code == 200:
-            data = response.json()
-            if isinstance(data, list):
-                # Try to save to local cache
-                if not _is_prod():
-                    try:
-                        # Ensure directory exists
-                        os.makedirs("local/rating_api", exist_ok=True)
-                        with open(cache_file, "w", encoding="utf-8") as f:
-                            json.dump(data, f, indent=2)
-                        print(
-                            f"Saved rating history for FIDE ID {fide_id} to {cache_file}"
-                        )
-                    except IOError as e:
-                        print(
-                            f"WARNING: Failed to save cache file {cache_file}: {str(e)}"
-                        )
-
-                return data
-            else:
+        await get_rate_limiter().acquire(url)
+        async with session.get(url) as response:
+            response.raise_for_status()
+            if response.status != 200:
+                print(
+                    f"WARNING: Unexpected status code {response.status} from Chess Tools API"
+                )
                 return None
-        else:
-            print(
-                f"WARNING: Unexpected status code {response.status_code} from Chess Tools API"
-            )
-            return None
+            data = await response.json(content_type=None)
 
-    except requests.exceptions.RequestException as e:
+        return data if isinstance(data, list) else None
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"ERROR: Failed to fetch rating history: {str(e)}")
         return None
     except ValueError as e:
@@ -583,6 +726,122 @@ def _get_rating_history(fide_id: str) -> Optional[List[Dict[str, Any]]]:
         return None
 
 
+def next_rating_period(now: datetime) -> datetime:
+    """The first day of the month after now, in UTC, when FIDE publishes a new list."""
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1, tzinfo=timezone.utc)
+    return datetime(now.year, now.month + 1, 1, tzinfo=timezone.utc)
+
+
+def rating_history_expires_at(
+    rating_history: List[Dict[str, Any]],
+    now: Optional[float] = None,
+    publish_grace_days: int = DEFAULT_RATING_PUBLISH_GRACE_DAYS,
+    retry_hours: float = DEFAULT_RATING_RETRY_HOURS,
+) -> float:
+    """
+    When a fetched rating history should be fetched again.
+
+    A history that has the current month's list stays valid until the next
+    rating period. One that doesn't yet is retried after retry_hours during
+    the first publish_grace_days of the month, in case the list just hasn't
+    reached the API; after that the player simply has no entry this month.
+
+    Returns:
+        float: Expiry as a Unix timestamp
+    """
+    now = time.time() if now is None else now
+    now_dt = datetime.fromtimestamp(now, timezone.utc)
+    latest_period = rating_history[0].get("date", "") if rating_history else ""
+    if latest_period < now_dt.strftime("%Y-%m") and now_dt.day <= publish_grace_days:
+        return now + retry_hours * 3600
+    return next_rating_period(now_dt).timestamp()
+
+
+class RatingHistoryCache:
+    """
+    Rating histories from the Chess Tools API, kept in the state store
+    until the next FIDE rating period.
+
+    Histories are keyed by FIDE id. The FIDE id each player's page showed
+    is remembered too, so prefetch() can start fetching the histories that
+    are missing or expired at the start of the run, alongside the player
+    pages. get() waits for a prefetch already in flight rather than
+    fetching twice. Call load() first, and close() and save() at the end.
+    """
+
+    def __init__(
+        self,
+        global_config: Optional[Dict[str, Any]],
+        config: Dict[str, Any],
+        session: aiohttp.ClientSession,
+    ):
+        self.session = session
+        self.publish_grace_days = config.get(
+            "rating_publish_grace_days", DEFAULT_RATING_PUBLISH_GRACE_DAYS
+        )
+        self.retry_hours = config.get("rating_retry_hours", DEFAULT_RATING_RETRY_HOURS)
+        self.cache = PersistentCache(
+            global_config,
+            RATING_CACHE_STATE_KEY,
+            max_entries=config.get(
+                "rating_cache_max_entries", DEFAULT_RATING_CACHE_MAX_ENTRIES
+            ),
+        )
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.fetched = 0
+
+    async def load(self):
+        await run_sync(self.cache.load)
+
+    async def save(self):
+        print(f"Rating history cache: {self.cache.stats()}, {self.fetched} fetched")
+        await run_sync(self.cache.save)
+
+    def remember_player(self, player: str, fide_id: str):
+        self.cache.set(f"player:{player}", fide_id, ttl=FIDE_ID_TTL_SECONDS)
+
+    def prefetch(self, players: List[str]):
+        """Start fetching the stale histories of players with a known FIDE id."""
+        for player in players:
+            fide_id = self.cache.peek(f"player:{player}")
+            if fide_id and not self.cache.is_fresh(f"history:{fide_id}"):
+                self._start_fetch(fide_id)
+
+    def _start_fetch(self, fide_id: str) -> asyncio.Task:
+        if fide_id not in self._pending:
+            self._pending[fide_id] = asyncio.create_task(self._fetch(fide_id))
+        return self._pending[fide_id]
+
+    async def _fetch(self, fide_id: str) -> Optional[List[Dict[str, Any]]]:
+        rating_history = await _get_rating_history(fide_id, self.session)
+        self.fetched += 1
+        # Failed fetches aren't cached, the next run tries again
+        if rating_history is not None:
+            self.cache.set(
+                f"history:{fide_id}",
+                rating_history,
+                expires_at=rating_history_expires_at(
+                    rating_history,
+                    publish_grace_days=self.publish_grace_days,
+                    retry_hours=self.retry_hours,
+                ),
+            )
+        return rating_history
+
+    async def get(self, fide_id: str) -> Optional[List[Dict[str, Any]]]:
+        if fide_id not in self._pending:
+            rating_history = self.cache.get(f"history:{fide_id}")
+            if rating_history is not None:
+                return rating_history
+        return await self._start_fetch(fide_id)
+
+    async def close(self):
+        """Wait for prefetches nobody asked for, so their results are saved."""
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+
+
 def _format_ratings_section(
     ratings: Dict[str, Optional[int]], rating_history: Optional[List[Dict[str, Any]]]
 ) -> str:
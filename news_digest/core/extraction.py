@@ -0,0 +1,288 @@
+import re
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+DEFAULT_EXTRACTION_BACKEND = "stream"
+
+# Elements that never contain article text
+REMOVED_TAGS = ["script", "style", "nav", "header", "footer", "aside"]
+
+# Common article content containers, in order of preference
+CONTENT_SELECTORS = [
+    "article",
+    '[role="main"]',
+    ".post-content",
+    ".article-content",
+    ".entry-content",
+    "#content",
+    ".content",
+    "main",
+]
+
+# Elements without an end tag
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _clean_text(text: str) -> str:
+    # Replace multiple spaces with single space
+    text = re.sub(r"\s+", " ", text)
+    # Replace multiple newlines with single newline
+    text = re.sub(r"\n\s*\n", "\n", text)
+    return text.strip()
+
+
+def extract_main_content_bs4(html_content: str) -> str:
+    """
+    Extract the main article text by building a full BeautifulSoup tree.
+
+    Slow, but the reference implementation the other backends are compared to.
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+
+    # Remove unwanted elements
+    for element in soup.find_all(REMOVED_TAGS):
+        element.decompose()
+
+    # Try to find the main content
+    main_content = None
+    for selector in CONTENT_SELECTORS:
+        main_content = soup.select_one(selector)
+        if main_content:
+            break
+
+    # If no main content found, use the body
+    if not main_content:
+        main_content = soup.body
+
+    if not main_content:
+        return ""
+
+    return _clean_text(main_content.get_text(separator=" ", strip=True))
+
+
+def _matches_selector(index: int, tag: str, attrs: Dict[str, str]) -> bool:
+    selector = CONTENT_SELECTORS[index]
+    if selector.startswith("["):
+        return attrs.get("role") == "main"
+    if selector.startswith("."):
+        return selector[1:] in (attrs.get("class") or "").split()
+    if selector.startswith("#"):
+        return attrs.get("id") == selector[1:]
+    return tag == selector
+
+
+class _MainContentScanner(HTMLParser):
+    """
+    Streaming equivalent of extract_main_content_bs4().
+
+    Tracks open elements on a stack instead of building a tree and collects
+    text for the first element matching each content selector, plus the
+    body. Once the most preferred container has been closed nothing later
+    in the document can beat it, so the scan is done.
+    """
+
+    BODY = len(CONTENT_SELECTORS)
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[str] = []
+        # Depth of the removed element (script, nav, ...) we're inside of
+        self.skip_depth: Optional[int] = None
+        # Capture index (selector index or BODY) -> (depth, text parts)
+        self.active: Dict[int, tuple[int, List[str]]] = {}
+        self.found: Dict[int, List[str]] = {}
+        self.pending_text: List[str] = []
+        self.done = False
+
+    def _flush_text(self):
+        # Text can arrive in several handle_data() calls; it's one string
+        # for BeautifulSoup, so strip it only once it's complete.
+        if not self.pending_text:
+            return
+        text = "".join(self.pending_text).strip()
+        self.pending_text = []
+        if text and self.skip_depth is None:
+            for _depth, parts in self.active.values():
+                parts.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if self.skip_depth is None:
+            if tag in REMOVED_TAGS:
+                self.skip_depth = len(self.stack)
+            else:
+                self._start_captures(tag, {k: v or "" for k, v in attrs})
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def _start_captures(self, tag, attrs):
+        started = [
+            index
+            for index in range(len(CONTENT_SELECTORS))
+            if index not in self.active
+            and index not in self.found
+            and _matches_selector(index, tag, attrs)
+        ]
+        if (
+            tag == "body"
+            and self.BODY not in self.active
+            and self.BODY not in self.found
+        ):
+            started.append(self.BODY)
+        for index in started:
+            if tag in VOID_TAGS:
+                # Matching element without content, e.g. <img class="content">
+                self._finish_capture(index, [])
+            else:
+                self.active[index] = (len(self.stack), [])
+
+    def _finish_capture(self, index, parts):
+        self.found[index] = parts
+        if index == 0:
+            self.done = True
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if tag not in self.stack:
+            return
+        # Unclosed children are closed along with their parent
+        while self._pop() != tag:
+            pass
+
+    def _pop(self) -> str:
+        tag = self.stack.pop()
+        depth = len(self.stack)
+        if self.skip_depth is not None and depth <= self.skip_depth:
+            self.skip_depth = None
+        for index, (capture_depth, parts) in list(self.active.items()):
+            if depth <= capture_depth:
+                del self.active[index]
+                self._finish_capture(index, parts)
+        return tag
+
+    def handle_data(self, data):
+        self.pending_text.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def finish(self):
+        self.close()
+        self._flush_text()
+        # Elements still open at the end of the document end there
+        for index, (_depth, parts) in self.active.items():
+            self.found[index] = parts
+        self.active = {}
+
+    def result(self) -> str:
+        if not self.found:
+            return ""
+        return _clean_text(" ".join(self.found[min(self.found)]))
+
+
+def extract_main_content_stream(html_content: str) -> str:
+    """
+    Extract the main article text with a streaming tag scanner.
+
+    Produces the same text as extract_main_content_bs4() without building a
+    tree, and stops reading as soon as an <article> element is closed.
+    """
+    scanner = _MainContentScanner()
+    for start in range(0, len(html_content), STREAM_CHUNK_SIZE):
+        scanner.feed(html_content[start : start + STREAM_CHUNK_SIZE])
+        if scanner.done:
+            break
+    scanner.finish()
+    return scanner.result()
+
+
+def _selector_to_xpath(selector: str) -> str:
+    if selector.startswith("["):
+        return '//*[@role="main"]'
+    if selector.startswith("."):
+        return f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {selector[1:]} ')]"
+    if selector.startswith("#"):
+        return f'//*[@id="{selector[1:]}"]'
+    return f"//{selector}"
+
+
+def extract_main_content_lxml(html_content: str) -> str:
+    """
+    Extract the main article text with lxml's C parser.
+
+    lxml is optional; raises ImportError if it isn't installed.
+    """
+    import lxml.html
+
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    root = lxml.html.document_fromstring(html_content.encode("utf-8"), parser=parser)
+
+    # Remove unwanted elements, keeping the text that follows them
+    for element in root.xpath("|".join(f"//{tag}" for tag in REMOVED_TAGS)):
+        element.drop_tree()
+
+    main_content = None
+    for selector in CONTENT_SELECTORS:
+        matches = root.xpath(_selector_to_xpath(selector))
+        if matches:
+            main_content = matches[0]
+            break
+
+    if main_content is None:
+        main_content = root.find("body")
+
+    if main_content is None:
+        return ""
+
+    texts = [t.strip() for t in main_content.xpath(".//text()")]
+    return _clean_text(" ".join(t for t in texts if t))
+
+
+EXTRACTION_BACKENDS: Dict[str, Callable[[str], str]] = {
+    "stream": extract_main_content_stream,
+    "lxml": extract_main_content_lxml,
+    "bs4": extract_main_content_bs4,
+}
+
+
+def extract_main_content(
+    html_content: str, backend: str = DEFAULT_EXTRACTION_BACKEND
+) -> str:
+    """
+    Extract the main article text from an HTML page.
+
+    Args:
+        html_content: HTML of the page
+        backend: One of EXTRACTION_BACKENDS. If it fails or finds nothing,
+            the BeautifulSoup backend is used as a fallback.
+
+    Returns:
+        str: Article text with whitespace collapsed, or "" if nothing was found
+    """
+    if backend != "bs4":
+        try:
+            text = EXTRACTION_BACKENDS[backend](html_content)
+            if text:
+                return text
+        except Exception as e:
+            print(f"Extraction backend {backend} failed, falling back to bs4: {e}")
+    return extract_main_content_bs4(html_content)
@@ -0,0 +1,79 @@
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+
+import feedparser
+
+from news_digest.utils.state import load_state, save_state
+
+
+def _feed_state_key(url: str) -> str:
+    return f"feeds/{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+
+def _to_state(value: Any) -> Any:
+    # Entries contain struct_time values (published_parsed etc.), which JSON can't represent
+    if isinstance(value, time.struct_time):
+        return {"__struct_time__": list(value)}
+    if isinstance(value, dict):
+        return {k: _to_state(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_state(v) for v in value]
+    return value
+
+
+def _from_state(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__struct_time__" in value:
+            return time.struct_time(value["__struct_time__"])
+        return feedparser.FeedParserDict({k: _from_state(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_from_state(v) for v in value]
+    return value
+
+
+def fetch_feed_entries(
+    url: str, global_config: Optional[Dict[str, Any]] = None
+) -> List[feedparser.FeedParserDict]:
+    """
+    Fetch feed entries with a conditional GET.
+
+    The ETag, Last-Modified value and entries of the previous fetch are kept
+    in the state store and sent back to the server. On 304 Not Modified the
+    cached entries are returned and nothing is parsed.
+
+    Args:
+        url: Feed URL
+        global_config: Global configuration, used to locate the state store
+
+    Returns:
+        list: Feed entries
+    """
+    state_key = _feed_state_key(url)
+    state = load_state(global_config, state_key, default={}) or {}
+
+    feed = feedparser.parse(url, etag=state.get("etag"), modified=state.get("modified"))
+
+    if feed.get("status") == 304 and "entries" in state:
+        print(
+            f"Feed not modified, reusing {len(state['entries'])} cached entries: {url}"
+        )
+        return _from_state(state["entries"])
+
+    print(feed.feed)
+
+    etag = feed.get("etag")
+    modified = feed.get("modified")
+    if feed.entries and (etag or modified):
+        save_state(
+            global_config,
+            state_key,
+            {
+                "url": url,
+                "etag": etag,
+                "modified": modified,
+                "entries": _to_state(feed.entries),
+            },
+        )
+
+    return feed.entries
@@ -1,4 +1,5 @@
 from typing import Any
+import asyncio
 import yaml
 import smtplib
 import ssl
@@ -12,6 +13,13 @@ from news_digest.core.hn import *
 from news_digest.core.reddit import *
 from news_digest.core.rss import *
 from news_digest.core.telegram import *
+from news_digest.utils.rate_limit import configure_rate_limits, get_rate_limiter
+from news_digest.utils.state import discard_deferred_state
+from news_digest.utils.sync_pool import (
+    DEFAULT_SYNC_WORKERS,
+    configure_sync_pool,
+    run_sync,
+)
 
 CONFIG: dict[str, Any] = {}
 
@@ -20,13 +28,13 @@ async def gen_source_digest(config, source_options=None, global_config=None) ->
     print(f"Generating source digest, config: {config}, options: {source_options}")
     try:
         if config["type"] == "rss":
-            return gen_rss_digest(config, source_options)
+            return await run_sync(gen_rss_digest, config, source_options, global_config)
         elif config["type"] == "reddit":
-            return await gen_reddit_digest(config, source_options)
+            return await gen_reddit_digest(config, source_options, global_config)
         elif config["type"] == "telegram":
-            return await gen_telegram_digest(config, source_options)
+            return await gen_telegram_digest(config, source_options, global_config)
         elif config["type"] == "hn":
-            return gen_hn_digest(config, source_options, global_config)
+            return await gen_hn_digest(config, source_options, global_config)
         elif config["type"] == "chess_players":
             return await gen_chess_players_digest(config, source_options, global_config)
         else:
@@ -38,6 +46,26 @@ async def gen_source_digest(config, source_options=None, global_config=None) ->
         return error_message
 
 
+async def gen_source_digests(sources, source_options=None, global_config=None):
+    execution = (global_config or {}).get("execution", {})
+    if execution.get("mode", "sequential") != "concurrent":
+        return [
+            await gen_source_digest(source, source_options, global_config)
+            for source in sources
+        ]
+
+    # gen_source_digest turns per-source failures into an error section,
+    # so one broken source doesn't cancel the rest of the gather.
+    # gather() returns results in the order of the sources in the config.
+    semaphore = asyncio.Semaphore(execution.get("max_concurrent_sources", 4))
+
+    async def gen_limited(source):
+        async with semaphore:
+            return await gen_source_digest(source, source_options, global_config)
+
+    return await asyncio.gather(*[gen_limited(source) for source in sources])
+
+
 def load_config():
     global CONFIG
     with open("config.yml", "r") as stream:
@@ -53,6 +81,15 @@ def load_config():
 
 async def gen_digest(upload_path, source_name=None, source_options=None):
     load_config()
+    # Blocking work (feed fetches, RSS parsing, summaries) runs in this pool
+    # so it doesn't block the event loop
+    configure_sync_pool(
+        CONFIG.get("execution", {}).get("sync_workers", DEFAULT_SYNC_WORKERS)
+    )
+    # Requests to the same host from all sources share one token bucket
+    configure_rate_limits(CONFIG.get("rate_limits"))
+    # State staged by sources is saved by commit_deferred_state() after delivery
+    discard_deferred_state()
     if source_name:
         # Find the specific source
         source = next((s for s in CONFIG["sources"] if s["name"] == source_name), None)
@@ -60,10 +97,13 @@ async def gen_digest(upload_path, source_name=None, source_options=None):
             raise ValueError(f"Source '{source_name}' not found in config")
         source_results = [await gen_source_digest(source, source_options, CONFIG)]
     else:
-        source_results = [
-            await gen_source_digest(source, source_options, CONFIG)
-            for source in CONFIG["sources"]
-        ]
+        source_results = await gen_source_digests(
+            CONFIG["sources"], source_options, CONFIG
+        )
+
+    rate_limit_waits = get_rate_limiter().stats()
+    if rate_limit_waits:
+        print(f"Rate limit waits (seconds per host): {rate_limit_waits}")
 
     source_results = [r for r in source_results if r is not None and len(r) > 0]
     script_src = """
@@ -176,6 +216,13 @@ async def gen_digest(upload_path, source_name=None, source_options=None):
     return result
 
 
+async def preview_reddit_schedule():
+    load_config()
+    for source in CONFIG["sources"]:
+        if source["type"] == "reddit":
+            print(await preview_monthly_schedule(source, CONFIG))
+
+
 def mail_digest(digest):
     load_config()
 
@@ -1,21 +1,38 @@
-import feedparser
+import asyncio
+import contextlib
+import hashlib
 from datetime import datetime
 from time import mktime
-import urllib.request
-import urllib.error
-import json
 import html
+import aiohttp
+import os
 import google.generativeai as genai
-from bs4 import BeautifulSoup
-import re
 
+from news_digest.core.extraction import (
+    DEFAULT_EXTRACTION_BACKEND,
+    extract_main_content,
+)
+from news_digest.core.feeds import fetch_feed_entries
+from news_digest.core.hn_api import (
+    DEFAULT_ITEM_FETCH_CONCURRENCY,
+    HNItemClient,
+    new_item_cache,
+)
+from news_digest.utils.rate_limit import get_rate_limiter
+from news_digest.utils.state import PersistentCache
+from news_digest.utils.sync_pool import run_sync
 from news_digest.utils.util import *
 
+GEMINI_MODEL = "gemini-2.0-flash"
+DEFAULT_LOCAL_MODEL = "openai/gpt-oss-120b"
+DEFAULT_SUMMARY_CACHE_MAX_ENTRIES = 5000
+DEFAULT_SUMMARY_FRESH_HOURS = 24
+DEFAULT_SUMMARY_MAX_IN_FLIGHT = 4
+# Summaries are kept this long after their last use, as long as the article text is unchanged
+SUMMARY_TTL = 90 * 86400
 
-def gen_hn_digest(config, source_options=None, global_config={}):
-    feed = feedparser.parse(config["url"])
-    print(feed.feed)
 
+async def gen_hn_digest(config, source_options=None, global_config={}):
     current_day = datetime.now().weekday() + 1
     if current_day not in config["days"]:
         print(
@@ -29,7 +46,7 @@ def gen_hn_digest(config, source_options=None, global_config={}):
     seconds_to_take = days_to_take * 86400
     print(f"Days to take for HN: {days_to_take}")
 
-    items = feed.entries
+    items = await run_sync(fetch_feed_entries, config["url"], global_config)
     items = [
         item
         for item in items
@@ -44,14 +61,48 @@ def gen_hn_digest(config, source_options=None, global_config={}):
 
     digest = f"<h2>{html.escape(config['name'])} ({len(items)} item(s))</h2>\n\n"
 
-    stories = [hn_item_to_html(config, item, global_config) for item in items]
+    item_cache = None
+    if config.get("item_cache", "yes") == "yes":
+        item_cache = await run_sync(new_item_cache(global_config, config).load)
+    summary_cache = None
+    ai_config = global_config.get("ai", {})
+    if "vendor" in ai_config and ai_config.get("summary_cache", {}).get(
+        "enabled", True
+    ):
+        summary_cache = await run_sync(new_summary_cache(global_config).load)
+
+    concurrency = config.get("item_fetch_concurrency", DEFAULT_ITEM_FETCH_CONCURRENCY)
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            client = await stack.enter_async_context(
+                HNItemClient(concurrency, item_cache)
+            )
+            # Add article summary if AI is configured
+            summarizer = None
+            if "vendor" in ai_config:
+                summarizer = await stack.enter_async_context(
+                    ArticleSummarizer(ai_config, summary_cache)
+                )
+            # Stories, comments and summaries for all items are fetched concurrently
+            stories = await asyncio.gather(
+                *[hn_item_to_html(config, item, client, summarizer) for item in items]
+            )
+    finally:
+        if item_cache is not None:
+            print(f"HN item cache: {item_cache.stats()}")
+            await run_sync(item_cache.save)
+        if summary_cache is not None:
+            print(f"Summary cache: {summary_cache.stats()}")
+            await run_sync(summary_cache.save)
     stories = [story.strip() + "\n<br>" for story in stories]
     digest += "\n" + ITEM_SEPARATOR.join(stories)
 
     return digest
 
 
-def hn_item_to_html(config, item, global_config={}):
+async def hn_item_to_html(
+    config, item, client: HNItemClient, summarizer: "ArticleSummarizer | None" = None
+):
     comments_url = item.comments
     story_id = comments_url.replace("https://news.ycombinator.com/item?id=", "")
 
@@ -66,9 +117,8 @@ def hn_item_to_html(config, item, global_config={}):
         + f"{item.description.strip()}"
     )
 
-    # Add article summary if AI is configured
-    if "ai" in global_config and "vendor" in global_config["ai"]:
-        summary = summarize_article(item.link, global_config["ai"])
+    if summarizer is not None:
+        summary = await summarizer.summarize_article(item.link)
         if summary:
             content += f"<b>Summary:</b><br><br>{html.escape(summary)}"
 
@@ -82,16 +132,11 @@ def hn_item_to_html(config, item, global_config={}):
 
     comments_html = "<br><br><b>Top comments:</b><br><br>\n"
     try:
-        story_content = urllib.request.urlopen(
-            f"https://hacker-news.firebaseio.com/v0/item/{story_id}.json"
-        ).read()
-        story_json = json.loads(story_content)
+        _story_json, comment_jsons = await client.get_story_with_comments(
+            story_id, config["top_comments"]
+        )
         per_comment_htmls = []
-        for comment_id in story_json["kids"][: config["top_comments"]]:
-            comment_content = urllib.request.urlopen(
-                f"https://hacker-news.firebaseio.com/v0/item/{comment_id}.json"
-            ).read()
-            comment_json = json.loads(comment_content)
+        for comment_json in comment_jsons:
             # per_comment_htmls.append(html.escape(comment_json["text"]))
             per_comment_htmls.append(comment_json["text"])
         comments_html += "<br><br>~~~~~~~~~~<br><br>\n".join(per_comment_htmls)
@@ -106,111 +151,168 @@ def hn_item_to_html(config, item, global_config={}):
     return title_html + collapsible_content
 
 
-def extract_main_content(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    # Remove unwanted elements
-    for element in soup.find_all(
-        ["script", "style", "nav", "header", "footer", "aside"]
-    ):
-        element.decompose()
-
-    # Try to find the main content
-    main_content = None
-
-    # Common article content containers
-    content_selectors = [
-        "article",
-        '[role="main"]',
-        ".post-content",
-        ".article-content",
-        ".entry-content",
-        "#content",
-        ".content",
-        "main",
-    ]
-
-    for selector in content_selectors:
-        main_content = soup.select_one(selector)
-        if main_content:
-            break
-
-    # If no main content found, use the body
-    if not main_content:
-        main_content = soup.body
+def new_summary_cache(global_config) -> PersistentCache:
+    cache_config = global_config.get("ai", {}).get("summary_cache", {})
+    return PersistentCache(
+        global_config,
+        "hn/summaries.json",
+        max_entries=cache_config.get("max_entries", DEFAULT_SUMMARY_CACHE_MAX_ENTRIES),
+    )
 
-    if not main_content:
-        return ""
 
-    # Get text content
-    text = main_content.get_text(separator=" ", strip=True)
+def summary_model_name(ai_config):
+    if ai_config.get("vendor", "gemini") == "gemini":
+        return GEMINI_MODEL
+    return ai_config.get("model", DEFAULT_LOCAL_MODEL)
 
-    # Clean up the text
-    text = re.sub(r"\s+", " ", text)  # Replace multiple spaces with single space
-    text = re.sub(
-        r"\n\s*\n", "\n", text
-    )  # Replace multiple newlines with single newline
 
-    return text.strip()
+class ArticleSummarizer:
+    """
+    Async article summarization client for the Gemini and local vendors.
 
+    Keeps one Gemini model object and one HTTP session (for article
+    downloads and the local OpenAI-compatible endpoint) for the whole run.
+    At most ai_config["max_in_flight"] LLM requests run at once; for the
+    local vendor this should match the number of slots the server exposes.
+    Use as an async context manager.
+    """
 
-def summarize_article(url, ai_config):
-    print(f"Summarizing article {url}")
-    try:
-        # Fetch the article content
+    def __init__(self, ai_config, summary_cache: PersistentCache | None = None):
+        self.ai_config = ai_config
+        self.vendor = ai_config.get("vendor", "gemini")
+        self.model_name = summary_model_name(ai_config)
+        self.summary_cache = summary_cache
+        self._semaphore = asyncio.Semaphore(
+            ai_config.get("max_in_flight", DEFAULT_SUMMARY_MAX_IN_FLIGHT)
+        )
+        self._session: aiohttp.ClientSession | None = None
+        self._gemini_model = None
+
+    async def __aenter__(self) -> "ArticleSummarizer":
+        self._session = aiohttp.ClientSession()
+        if self.vendor == "gemini":
+            genai.configure(api_key=self.ai_config["key"])
+            self._gemini_model = genai.GenerativeModel(self.model_name)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def summarize_article(self, url):
+        print(f"Summarizing article {url}")
+        if self.vendor not in ("gemini", "local"):
+            return f"Unknown AI vendor: {self.vendor}"
+
+        # Recently summarized URL: skip both the download and the LLM call.
+        # The URL pointer is only peeked at, so each article counts as one
+        # hit or miss in the cache stats.
+        url_key = f"url:{self.vendor}:{self.model_name}:{url}"
+        if self.summary_cache is not None and self.summary_cache.is_fresh(url_key):
+            fresh_summary_key = self.summary_cache.peek(url_key)["summary_key"]
+            if self.summary_cache.is_fresh(fresh_summary_key):
+                print(f"Using cached summary for {url}")
+                return self.summary_cache.get(fresh_summary_key)
+
+        try:
+            text_content = await self._fetch_article_text(url)
+
+            # Same URL, text, vendor and model: the summary would be the same
+            text_hash = hashlib.sha256(text_content.encode("utf-8")).hexdigest()
+            summary_key = f"summary:{self.vendor}:{self.model_name}:{url}:{text_hash}"
+            if self.summary_cache is not None:
+                summary = self.summary_cache.get(summary_key)
+                if summary is not None:
+                    print(f"Article text unchanged, using cached summary for {url}")
+                    self._remember_summary(url_key, summary_key)
+                    return summary
+
+            prompt = f"Please provide a concise summary of the following article in 2-3 sentences:\n\n{text_content}"
+            async with self._semaphore:
+                summary = await self._generate(prompt)
+
+            if self.summary_cache is not None and summary:
+                self.summary_cache.set(summary_key, summary, ttl=SUMMARY_TTL)
+                self._remember_summary(url_key, summary_key)
+            return summary
+
+        except aiohttp.ClientResponseError as e:
+            print(f"HTTP error. Status: {e.status}, Reason: {e.message}")
+            return f"HTTP error: {html.escape(str(e))}"
+        except Exception as e:
+            print(f"Error summarizing article {url}: {e}")
+            return f"Error summarizing article: {html.escape(str(e))}"
+
+    async def _fetch_article_text(self, url):
+        assert (
+            self._session is not None
+        ), "ArticleSummarizer must be used with async with"
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        req = urllib.request.Request(url, headers=headers)
-        response = urllib.request.urlopen(req, timeout=10)
-        html_content = response.read().decode("utf-8")
+        await get_rate_limiter().acquire(url)
+        async with self._session.get(
+            url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=10),
+            raise_for_status=True,
+        ) as response:
+            html_content = (await response.read()).decode("utf-8")
         print(f"Article content length: {len(html_content)}")
-        # Extract main content using BeautifulSoup
-        text_content = extract_main_content(html_content)
+        if "store_articles_dir" in self.ai_config:
+            # Corpus for scripts/benchmark_extraction.py
+            await run_sync(self._store_article, url, html_content)
+        # Extracting the main content is CPU-bound, keep it off the event loop
+        text_content = await run_sync(
+            extract_main_content,
+            html_content,
+            self.ai_config.get("extraction_backend", DEFAULT_EXTRACTION_BACKEND),
+        )
         print(f"Text content length: {len(text_content)}")
 
         # Truncate text if it's too long (context limit)
         if len(text_content) > 30000:
             text_content = text_content[:30000]
-
-        # Generate summary based on vendor
-        vendor = ai_config.get("vendor", "gemini")
-        prompt = f"Please provide a concise summary of the following article in 2-3 sentences:\n\n{text_content}"
-
-        if vendor == "gemini":
-            # Configure the Gemini API
-            genai.configure(api_key=ai_config["key"])
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = model.generate_content(prompt)
+        return text_content
+
+    def _store_article(self, url, html_content):
+        directory = self.ai_config["store_articles_dir"]
+        os.makedirs(directory, exist_ok=True)
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        with open(os.path.join(directory, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(html_content)
+
+    async def _generate(self, prompt):
+        if self.vendor == "gemini":
+            response = await self._gemini_model.generate_content_async(prompt)
             return response.text
-        elif vendor == "local":
-            # Use local OpenAI-compatible endpoint
-            endpoint = ai_config.get(
-                "endpoint", "http://framework-desktop.local:1234/v1/chat/completions"
-            )
-            model_name = ai_config.get("model", "openai/gpt-oss-120b")
-
-            # Prepare the request
-            data = {
-                "model": model_name,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.7,
-            }
-
-            req = urllib.request.Request(
-                endpoint,
-                data=json.dumps(data).encode("utf-8"),
-                headers={"Content-Type": "application/json"},
-            )
-            response = urllib.request.urlopen(req, timeout=30)
-            response_data = json.loads(response.read().decode("utf-8"))
-            return response_data["choices"][0]["message"]["content"]
-        else:
-            return f"Unknown AI vendor: {vendor}"
-
-    except urllib.error.HTTPError as e:
-        print(f"HTTP error. Status: {e.status}, Reason: {e.reason}")
-        return f"HTTP error: {html.escape(str(e))}"
-    except Exception as e:
-        print(f"Error summarizing article {url}: {e}")
-        return f"Error summarizing article: {html.escape(str(e))}"
+
+        # Use local OpenAI-compatible endpoint
+        assert (
+            self._session is not None
+        ), "ArticleSummarizer must be used with async with"
+        endpoint = self.ai_config.get(
+            "endpoint", "http://framework-desktop.local:1234/v1/chat/completions"
+        )
+        data = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7,
+        }
+        async with self._session.post(
+            endpoint,
+            json=data,
+            timeout=aiohttp.ClientTimeout(total=self.ai_config.get("timeout", 30)),
+            raise_for_status=True,
+        ) as response:
+            response_data = await response.json(content_type=None)
+        return response_data["choices"][0]["message"]["content"]
+
+    def _remember_summary(self, url_key, summary_key):
+        fresh_hours = self.ai_config.get("summary_cache", {}).get(
+            "fresh_hours", DEFAULT_SUMMARY_FRESH_HOURS
+        )
+        self.summary_cache.set(
+            url_key, {"summary_key": summary_key}, ttl=fresh_hours * 3600
+        )
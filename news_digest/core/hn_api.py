@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from news_digest.utils.rate_limit import HostRateLimiter, get_rate_limiter
+from news_digest.utils.state import PersistentCache
+
+HN_ITEM_URL = "https://hacker-news.firebaseio.com/v0/item/{}.json"
+DEFAULT_ITEM_FETCH_CONCURRENCY = 10
+DEFAULT_ITEM_CACHE_MAX_ENTRIES = 20000
+
+# (max story age, TTL) in seconds. A story's score, comment count and "kids"
+# order keep changing while it's on the front page; week-old ones are
+# effectively frozen.
+ITEM_TTL_BY_AGE = [
+    (2 * 3600, 10 * 60),
+    (86400, 3600),
+    (3 * 86400, 6 * 3600),
+    (14 * 86400, 2 * 86400),
+]
+OLD_ITEM_TTL = 30 * 86400
+# Comments can only be edited for two hours; the digest doesn't read their
+# replies, so after that they can be kept across many daily runs
+COMMENT_EDIT_WINDOW = 2 * 3600
+COMMENT_TTL = 14 * 86400
+
+
+def item_cache_ttl(item: Dict[str, Any], now: Optional[float] = None) -> float:
+    """
+    Pick a cache TTL for an item based on its type and age (the item's
+    "time" field). A comment still inside its edit window is cached until
+    the window closes.
+    """
+    now = time.time() if now is None else now
+    age = now - item.get("time", now)
+    if item.get("type") == "comment":
+        if age >= COMMENT_EDIT_WINDOW:
+            return COMMENT_TTL
+        return COMMENT_EDIT_WINDOW - age
+    for max_age, ttl in ITEM_TTL_BY_AGE:
+        if age < max_age:
+            return ttl
+    return OLD_ITEM_TTL
+
+
+def new_item_cache(global_config, config) -> PersistentCache:
+    return PersistentCache(
+        global_config,
+        "hn/items.json",
+        max_entries=config.get(
+            "item_cache_max_entries", DEFAULT_ITEM_CACHE_MAX_ENTRIES
+        ),
+    )
+
+
+class HNItemClient:
+    """
+    Async client for the Hacker News Firebase item API.
+
+    Keeps one keep-alive connection pool for the whole run and limits the
+    number of requests in flight, and paces requests with the shared
+    per-host rate limiter. If a cache is given, items are read through it.
+    Use as an async context manager.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_ITEM_FETCH_CONCURRENCY,
+        cache: Optional[PersistentCache] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+    ):
+        self._concurrency = concurrency
+        self._cache = cache
+        self._rate_limiter = rate_limiter or get_rate_limiter()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "HNItemClient":
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self._concurrency),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_item(self, item_id) -> Dict[str, Any]:
+        """
+        Fetch a single item (story, comment, ...) by id.
+
+        Raises:
+            aiohttp.ClientError: If the request fails
+        """
+        assert self._session is not None, "HNItemClient must be used with async with"
+        if self._cache is not None:
+            cached = self._cache.get(str(item_id))
+            if cached is not None:
+                return cached
+
+        url = HN_ITEM_URL.format(item_id)
+        await self._rate_limiter.acquire(url)
+        async with self._semaphore:
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                item = await response.json()
+
+        # Firebase returns null for unknown ids, don't cache that
+        if self._cache is not None and item is not None:
+            self._cache.set(str(item_id), item, ttl=item_cache_ttl(item))
+        return item
+
+    async def get_story_with_comments(
+        self, story_id, top_comments: int
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Fetch a story and its first top_comments comments concurrently.
+
+        Returns:
+            tuple: (story item, comment items in the story's "kids" order)
+        """
+        story = await self.get_item(story_id)
+        comments = await asyncio.gather(
+            *[self.get_item(kid) for kid in story.get("kids", [])[:top_comments]]
+        )
+        return story, list(comments)
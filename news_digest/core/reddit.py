@@ -1,15 +1,81 @@
 from datetime import datetime, date
+import asyncio
 import asyncpraw
 import asyncpraw.models
 from calendar import monthrange
 import hashlib
+import math
+import time
 
 
+from news_digest.utils.state import load_state, save_state
+from news_digest.utils.sync_pool import run_sync
 from news_digest.utils.util import *
 
+DEFAULT_MAX_CONCURRENT_SUBREDDITS = 8
+# Below this many remaining requests in the rate limit window,
+# subreddits are fetched one at a time.
+RATE_LIMIT_LOW_WATERMARK = 20
+DEFAULT_MULTIREDDIT_BATCH_SIZE = 50
+DEFAULT_MULTIREDDIT_LIMIT_PER_SUBREDDIT = 10
+DEFAULT_SUBSCRIPTIONS_CACHE_HOURS = 24 * 7
+SUBSCRIPTIONS_STATE_KEY = "reddit/subscriptions.json"
+DEFAULT_MONTHLY_BALANCE_EPSILON = 0.1
+
+
+def new_reddit_session(config) -> asyncpraw.Reddit:
+    # asyncpraw doesn't authenticate until the first request
+    return asyncpraw.Reddit(
+        user_agent="USERAGENT",
+        client_id=config["client_id"],
+        client_secret=config["secret"],
+        username=config["user"],
+        password=config["password"],
+    )
+
+
+async def get_subscriptions(
+    get_session, config, source_options=None, global_config=None
+) -> list[str]:
+    """
+    Names of the subreddits the user is subscribed to.
+
+    The list is cached in the state store for subscriptions_cache_hours
+    (default a week), so most runs don't need to log in to Reddit just for
+    it. source_options["refresh_subscriptions"] forces a refresh.
+    """
+    use_cache = config.get("subscriptions_cache", "yes") == "yes"
+    refresh = bool(source_options and source_options.get("refresh_subscriptions"))
+    ttl = (
+        config.get("subscriptions_cache_hours", DEFAULT_SUBSCRIPTIONS_CACHE_HOURS)
+        * 3600
+    )
+
+    if use_cache and not refresh:
+        cached = await run_sync(load_state, global_config, SUBSCRIPTIONS_STATE_KEY)
+        if cached and time.time() - cached["fetched_at"] < ttl:
+            print(f"Using {len(cached['subreddits'])} cached subscriptions")
+            return cached["subreddits"]
+
+    session: asyncpraw.Reddit = get_session()
+    # Set a reasonable limit
+    subscriptions = [
+        subreddit.display_name async for subreddit in session.user.subreddits(limit=500)
+    ]
+    print(f"Fetched {len(subscriptions)} subscriptions")
+
+    if use_cache:
+        await run_sync(
+            save_state,
+            global_config,
+            SUBSCRIPTIONS_STATE_KEY,
+            {"fetched_at": time.time(), "subreddits": subscriptions},
+        )
+    return subscriptions
+
 
 async def get_subreddits(
-    session: asyncpraw.Reddit, config, source_options=None
+    get_session, config, source_options=None, global_config=None
 ) -> list[str]:
     # If specific subreddits are requested, use only those
     if source_options and "subreddits" in source_options:
@@ -23,40 +89,24 @@ async def get_subreddits(
     print(f"Day of month: {day_of_month}")
     print(f"Days in this month: {days_in_month}")
 
-    # Given days of week, e.g. [1, 3, 5], select days of month,
-    # e.g. all mondays, wednesdays and fridays of this month
-    days_for_monthly = []
-    # Take only the first 4 weeks of the month,
-    # so assignment is consistent across months.
-    max_days_for_monthly = len(config["days_for_monthly"]) * 4
-    for day in range(days_in_month):
-        d = date(datetime.now().year, datetime.now().month, day + 1)
-        if d.weekday() + 1 in config["days_for_monthly"]:
-            days_for_monthly.append(day + 1)
-            if len(days_for_monthly) >= max_days_for_monthly:
-                break
+    days_for_monthly = get_days_for_monthly(config, datetime.now())
     print(f"Days for monthly: {days_for_monthly}")
 
-    sub_candidates: list[tuple[str, str, int]] = []
-    # r/all is a special case. It's not returned by session.user.subreddits,
-    # so we need to add it manually if it's configured.
-    if "all" in config["overrides"]:
-        sub_candidates.append(
-            ("all", get_frequency(config, "all"), get_day(config, "all"))
-        )
-
-    async for subreddit in session.user.subreddits(limit=500):  # Set a reasonable limit
-        if subreddit.display_name in config["exclude"]:
-            continue
-        frequency = get_frequency(config, subreddit.display_name)
-        day = get_day(config, subreddit.display_name)
-        sub_candidates.append((subreddit.display_name, frequency, day))
+    sub_candidates = await get_sub_candidates(
+        get_session, config, source_options, global_config
+    )
 
     print("Sub candidates:")
     duration_priorities = {"day": 1, "week": 2, "month": 3}
     sub_candidates = sorted(sub_candidates, key=lambda s: duration_priorities[s[1]])
     print(sub_candidates)
 
+    monthly_days = assign_monthly_days(
+        config,
+        [name for name, frequency, _ in sub_candidates if frequency == "month"],
+        days_for_monthly,
+    )
+
     subs: list[str] = []
     for subreddit_name, frequency, day in sub_candidates:
         take = False
@@ -72,8 +122,7 @@ async def get_subreddits(
                 take = True
 
         if frequency == "month":
-            subreddit_hash = string_to_int_hash(subreddit_name)
-            day_for_subreddit = days_for_monthly[subreddit_hash % len(days_for_monthly)]
+            day_for_subreddit = monthly_days[subreddit_name]
             print(
                 f"Day for subreddit {subreddit_name}: {day_for_subreddit}. Today: {day_of_month + 1}"
             )
@@ -88,6 +137,132 @@ async def get_subreddits(
     return subs
 
 
+def get_days_for_monthly(config, now: datetime) -> list[int]:
+    _, days_in_month = monthrange(now.year, now.month)
+
+    # Given days of week, e.g. [1, 3, 5], select days of month,
+    # e.g. all mondays, wednesdays and fridays of this month
+    days_for_monthly = []
+    # Take only the first 4 weeks of the month,
+    # so assignment is consistent across months.
+    max_days_for_monthly = len(config["days_for_monthly"]) * 4
+    for day in range(days_in_month):
+        d = date(now.year, now.month, day + 1)
+        if d.weekday() + 1 in config["days_for_monthly"]:
+            days_for_monthly.append(day + 1)
+            if len(days_for_monthly) >= max_days_for_monthly:
+                break
+    return days_for_monthly
+
+
+async def get_sub_candidates(
+    get_session, config, source_options=None, global_config=None
+) -> list[tuple[str, str, int]]:
+    sub_candidates: list[tuple[str, str, int]] = []
+    # r/all is a special case. It's not returned by session.user.subreddits,
+    # so we need to add it manually if it's configured.
+    if "all" in config["overrides"]:
+        sub_candidates.append(
+            ("all", get_frequency(config, "all"), get_day(config, "all"))
+        )
+
+    for subreddit_name in await get_subscriptions(
+        get_session, config, source_options, global_config
+    ):
+        if subreddit_name in config["exclude"]:
+            continue
+        frequency = get_frequency(config, subreddit_name)
+        day = get_day(config, subreddit_name)
+        sub_candidates.append((subreddit_name, frequency, day))
+    return sub_candidates
+
+
+def assign_monthly_days(
+    config, subreddit_names: list[str], days_for_monthly: list[int]
+) -> dict[str, int]:
+    """
+    Assign each monthly subreddit to one of days_for_monthly.
+
+    monthly_scheduler: "hash" is the plain MD5-modulo assignment. The default,
+    "balanced", is consistent hashing with bounded loads: subreddits are
+    placed in hash order on their hash slot, or on the next slot with room if
+    it's full. A slot's capacity is (1 + monthly_balance_epsilon) times the
+    average load, counted in submissions_per_subreddit. The assignment
+    depends only on the set of subreddits, and adding or removing one moves
+    only a few others.
+    """
+    slot_count = len(days_for_monthly)
+    if config.get("monthly_scheduler", "balanced") == "hash":
+        return {
+            name: days_for_monthly[string_to_int_hash(name) % slot_count]
+            for name in subreddit_names
+        }
+
+    weights = {
+        name: get_submissions_per_subreddit(config, name) for name in subreddit_names
+    }
+    epsilon = config.get("monthly_balance_epsilon", DEFAULT_MONTHLY_BALANCE_EPSILON)
+    capacity = max(
+        math.ceil(sum(weights.values()) * (1 + epsilon) / slot_count),
+        max(weights.values(), default=0),
+    )
+
+    loads = [0] * slot_count
+    result: dict[str, int] = {}
+    for name in sorted(subreddit_names, key=lambda n: (string_to_int_hash(n), n)):
+        start = string_to_int_hash(name) % slot_count
+        slot = next(
+            (
+                (start + probe) % slot_count
+                for probe in range(slot_count)
+                if loads[(start + probe) % slot_count] + weights[name] <= capacity
+            ),
+            min(range(slot_count), key=lambda i: loads[i]),
+        )
+        loads[slot] += weights[name]
+        result[name] = days_for_monthly[slot]
+    return result
+
+
+async def preview_monthly_schedule(config, global_config=None) -> str:
+    """
+    Describe the per-day load of monthly subreddits for the current month.
+    """
+    session: asyncpraw.Reddit | None = None
+
+    def get_session() -> asyncpraw.Reddit:
+        nonlocal session
+        if session is None:
+            session = new_reddit_session(config)
+        return session
+
+    try:
+        sub_candidates = await get_sub_candidates(
+            get_session, config, None, global_config
+        )
+    finally:
+        if session is not None:
+            await session.close()
+
+    now = datetime.now()
+    days_for_monthly = get_days_for_monthly(config, now)
+    monthly = [name for name, frequency, _ in sub_candidates if frequency == "month"]
+    monthly_days = assign_monthly_days(config, monthly, days_for_monthly)
+
+    lines = [
+        f"Monthly subreddits for {now.strftime('%Y-%m')} "
+        f"({config.get('monthly_scheduler', 'balanced')} scheduler): {len(monthly)}"
+    ]
+    for day in days_for_monthly:
+        names = sorted(n for n, d in monthly_days.items() if d == day)
+        load = sum(get_submissions_per_subreddit(config, n) for n in names)
+        lines.append(
+            f"{now.strftime('%Y-%m')}-{day:02d}: {len(names):3d} subreddit(s), "
+            f"load {load:4d} | {', '.join(names)}"
+        )
+    return "\n".join(lines)
+
+
 def string_to_int_hash(s: str):
     # Use hashlib to create a hash of the string (MD5 is chosen here)
     return int(hashlib.md5(s.encode()).hexdigest(), 16)
@@ -215,13 +390,112 @@ def get_submissions_per_subreddit(config, subreddit_name: str):
     return config["submissions_per_subreddit"]
 
 
-async def gen_subreddit_digest(session: asyncpraw.Reddit, config, subreddit_name: str):
+def get_max_time_diff(frequency: str) -> int:
+    if frequency == "day":
+        return 86400 * 2
+    elif frequency == "week":
+        return 86400 * 7 * 2
+    elif frequency == "month":
+        return 86400 * 31 * 2
+    else:
+        exit(1)
+
+
+def is_recent_submission(
+    submission: asyncpraw.models.Submission, max_time_diff: int
+) -> bool:
+    return (
+        datetime.now() - datetime.utcfromtimestamp(submission.created_utc)
+    ).total_seconds() <= max_time_diff
+
+
+async def fetch_multireddit_batch(
+    session: asyncpraw.Reddit, config, frequency: str, subreddit_names: list[str]
+) -> dict[str, list[asyncpraw.models.Submission]]:
+    """
+    Fetch submissions for several subreddits with one combined a+b+c listing.
+
+    Returns submissions for every subreddit whose submissions_per_subreddit
+    quota was filled from the combined listing. If the listing ran out before
+    its limit, it contained everything and all subreddits are returned.
+    Subreddits missing from the result need a per-subreddit fetch.
+    """
+    max_time_diff = get_max_time_diff(frequency)
+    quotas = {
+        name.lower(): get_submissions_per_subreddit(config, name)
+        for name in subreddit_names
+    }
+    by_name: dict[str, list[asyncpraw.models.Submission]] = {
+        name.lower(): [] for name in subreddit_names
+    }
+    limit = min(
+        1000,
+        len(subreddit_names)
+        * config.get(
+            "multireddit_limit_per_subreddit", DEFAULT_MULTIREDDIT_LIMIT_PER_SUBREDDIT
+        ),
+    )
+
+    listed = 0
+    try:
+        multireddit = await session.subreddit("+".join(subreddit_names))
+        async for submission in multireddit.top(time_filter=frequency, limit=limit):
+            listed += 1
+            name = submission.subreddit.display_name.lower()
+            if name not in by_name or len(by_name[name]) >= quotas[name]:
+                continue
+            if is_recent_submission(submission, max_time_diff):
+                by_name[name].append(submission)
+            if all(len(by_name[n]) >= quotas[n] for n in by_name):
+                break
+    except Exception as e:
+        print(f"Unable to list multireddit {'+'.join(subreddit_names)}: {e}")
+        return {}
+
+    exhausted = listed < limit
+    result = {
+        name: by_name[name.lower()]
+        for name in subreddit_names
+        if exhausted or len(by_name[name.lower()]) >= quotas[name.lower()]
+    }
+    print(
+        f"Multireddit ({frequency}) filled {len(result)}/{len(subreddit_names)} subreddits "
+        f"from {listed} submissions"
+    )
+    return result
+
+
+def group_subreddits_for_batching(config, subreddits: list[str]):
+    """
+    Split subreddits into (frequency, names) batches for fetch_multireddit_batch.
+    """
+    by_frequency: dict[str, list[str]] = {}
+    for subreddit_name in subreddits:
+        # r/all can't be combined with other subreddits
+        if subreddit_name.lower() == "all":
+            continue
+        frequency = get_frequency(config, subreddit_name)
+        by_frequency.setdefault(frequency, []).append(subreddit_name)
+
+    batch_size = config.get("multireddit_batch_size", DEFAULT_MULTIREDDIT_BATCH_SIZE)
+    batches = []
+    for frequency, names in by_frequency.items():
+        for start in range(0, len(names), batch_size):
+            batch = names[start : start + batch_size]
+            # A single subreddit is fetched on its own anyway
+            if len(batch) > 1:
+                batches.append((frequency, batch))
+    return batches
+
+
+async def gen_subreddit_digest(
+    session: asyncpraw.Reddit,
+    config,
+    subreddit_name: str,
+    submissions: list[asyncpraw.models.Submission] | None = None,
+):
     frequency = get_frequency(config, subreddit_name)
-    day = get_day(config, subreddit_name)
-    subreddit = await session.subreddit(subreddit_name)
-    submissions_gen = subreddit.top(
-        time_filter=frequency, limit=50
-    )  # Set a reasonable limit
+    max_time_diff = get_max_time_diff(frequency)
 
     spoiler = False
     if (
@@ -230,36 +504,31 @@ async def gen_subreddit_digest(session: asyncpraw.Reddit, config, subreddit_name
     ):
         spoiler = config["overrides"][subreddit_name]["spoiler"]
 
-    if frequency == "day":
-        max_time_diff = 86400 * 2
-    elif frequency == "week":
-        max_time_diff = 86400 * 7 * 2
-    elif frequency == "month":
-        max_time_diff = 86400 * 31 * 2
-    else:
-        exit(1)
-
     if frequency == "day":
         frequency_readable = "daily"
     else:
         frequency_readable = f"{frequency}ly"
 
-    try:
-        submissions: list[asyncpraw.models.Submission] = []
-        async for submission in submissions_gen:
-            if (
-                datetime.now() - datetime.utcfromtimestamp(submission.created_utc)
-            ).total_seconds() <= max_time_diff:
-                submissions.append(submission)
-            if len(submissions) >= get_submissions_per_subreddit(
-                config, subreddit_name
-            ):
-                break
-    except Exception as e:
-        print(f"Unable to list submissions for {subreddit_name}: {e}")
-        digest = f"<h4>/r/{subreddit_name} ({frequency_readable})</h4>"
-        digest += f"<p>Unable to list submissions: {e}</p>"
-        return digest
+    # Submissions may have been prefetched with a multireddit listing
+    if submissions is None:
+        try:
+            subreddit = await session.subreddit(subreddit_name)
+            submissions_gen = subreddit.top(
+                time_filter=frequency, limit=50
+            )  # Set a reasonable limit
+            submissions = []
+            async for submission in submissions_gen:
+                if is_recent_submission(submission, max_time_diff):
+                    submissions.append(submission)
+                if len(submissions) >= get_submissions_per_subreddit(
+                    config, subreddit_name
+                ):
+                    break
+        except Exception as e:
+            print(f"Unable to list submissions for {subreddit_name}: {e}")
+            digest = f"<h4>/r/{subreddit_name} ({frequency_readable})</h4>"
+            digest += f"<p>Unable to list submissions: {e}</p>"
+            return digest
 
     if not submissions:
         return None
@@ -285,25 +554,82 @@ async def gen_subreddit_digest(session: asyncpraw.Reddit, config, subreddit_name
     return digest
 
 
-async def gen_reddit_digest(config, source_options=None) -> str:
-    session = asyncpraw.Reddit(
-        user_agent="USERAGENT",
-        client_id=config["client_id"],
-        client_secret=config["secret"],
-        username=config["user"],
-        password=config["password"],
+def get_rate_limit_remaining(session: asyncpraw.Reddit):
+    # Updated by asyncprawcore from the x-ratelimit-* headers of every response.
+    # None until the first response arrives.
+    rate_limiter = getattr(getattr(session, "_core", None), "_rate_limiter", None)
+    return getattr(rate_limiter, "remaining", None)
+
+
+async def gen_subreddit_digests(
+    session: asyncpraw.Reddit, config, subreddits: list[str]
+):
+    """
+    Generate digests for subreddits concurrently over the shared session.
+
+    Results are in the same order as subreddits.
+    """
+    semaphore = asyncio.Semaphore(
+        config.get("max_concurrent_subreddits", DEFAULT_MAX_CONCURRENT_SUBREDDITS)
     )
+    low_budget_lock = asyncio.Lock()
+
+    async def run_limited(fetch, *args):
+        async with semaphore:
+            remaining = get_rate_limit_remaining(session)
+            if remaining is not None and remaining < RATE_LIMIT_LOW_WATERMARK:
+                # Close to the rate limit: go one at a time and let asyncprawcore
+                # space requests out until the window resets
+                async with low_budget_lock:
+                    return await fetch(*args)
+            return await fetch(*args)
+
+    prefetched: dict[str, list[asyncpraw.models.Submission]] = {}
+    if config.get("fetch_mode", "per_subreddit") == "batched":
+        batch_results = await asyncio.gather(
+            *[
+                run_limited(fetch_multireddit_batch, session, config, frequency, names)
+                for frequency, names in group_subreddits_for_batching(
+                    config, subreddits
+                )
+            ]
+        )
+        for batch_result in batch_results:
+            prefetched.update(batch_result)
+
+    # Subreddits that weren't filled from a multireddit are fetched one by one
+    return await asyncio.gather(
+        *[
+            run_limited(gen_subreddit_digest, session, config, s, prefetched.get(s))
+            for s in subreddits
+        ]
+    )
+
+
+async def gen_reddit_digest(config, source_options=None, global_config=None) -> str:
+    session: asyncpraw.Reddit | None = None
+
+    def get_session() -> asyncpraw.Reddit:
+        # Created on demand: with a cached subscription list and nothing
+        # due today there's no need to talk to Reddit at all
+        nonlocal session
+        if session is None:
+            session = new_reddit_session(config)
+        return session
 
     try:
-        subreddits = await get_subreddits(session, config, source_options)
+        subreddits = await get_subreddits(
+            get_session, config, source_options, global_config
+        )
         if len(subreddits) == 0:
             return ""
         digest = f"<h2>Reddit ({len(subreddits)} subreddits)</h2>"
-        subreddit_digests = [
-            await gen_subreddit_digest(session, config, s) for s in subreddits
-        ]
+        subreddit_digests = await gen_subreddit_digests(
+            get_session(), config, subreddits
+        )
         subreddit_digests = [d for d in subreddit_digests if d is not None]
         digest += "\n<br>".join(subreddit_digests)
         return digest
     finally:
-        await session.close()
+        if session is not None:
+            await session.close()
@@ -1,12 +1,12 @@
-import feedparser
 from datetime import datetime
 from time import mktime
 import re
 
+from news_digest.core.feeds import fetch_feed_entries
 from news_digest.utils.util import *
 
 
-def gen_rss_digest(config, source_options=None):
+def gen_rss_digest(config, source_options=None, global_config=None):
     current_day = datetime.now().weekday() + 1
     if current_day not in config["days"]:
         print(
@@ -14,9 +14,7 @@ def gen_rss_digest(config, source_options=None):
         )
         return ""
 
-    feed = feedparser.parse(config["url"])
-    print(feed.feed)
-    items = feed.entries
+    items = fetch_feed_entries(config["url"], global_config)
     # if items:
     #     print(items[0])
     items = [
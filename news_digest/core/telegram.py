@@ -1,86 +1,75 @@
 from datetime import datetime
 from telethon.sync import TelegramClient
+from telethon.errors import FloodWaitError
 from telethon.tl.functions.messages import GetHistoryRequest
 from telethon.tl.functions.users import GetFullUserRequest
 import telethon
-import shutil
-import base64
-import regex
-
+import asyncio
+import hashlib
+
+from news_digest.core.telegram_media import (
+    InlineImageProcessor,
+    MediaDownloadScheduler,
+    TelegramMediaStore,
+)
+from news_digest.core.telegram_session import TelegramSessionStore
+from news_digest.utils.state import PersistentCache, defer_state, load_state
+from news_digest.utils.sync_pool import run_sync
 from news_digest.utils.util import *
 
-
-def insert_spaces_after_emojis(text: str) -> str:
-    """
-    Insert a space after each emoji in the text.
-    Uses regex to detect emoji characters.
-
-    Args:
-        text: The input text containing emojis
-
-    Returns:
-        Text with spaces inserted after each emoji
-    """
-    # Regex pattern to match any character that takes two code points
-    # This matches characters outside the Basic Multilingual Plane (U+10000 and above)
-    emoji_pattern = regex.compile(r"[\U00010000-\U0010FFFF]")
-
-    # Find all emoji positions
-    emoji_positions = []
-    for match in emoji_pattern.finditer(text):
-        emoji_positions.append(match.end())
-
-    # Insert spaces after emojis (in reverse order to maintain positions)
-    result = text
-    for pos in reversed(emoji_positions):
-        result = result[:pos] + " " + result[pos:]
-
-    return result
-
-
-def remove_spaces_after_emojis(text: str) -> str:
-    """
-    Remove spaces that appear after emoji characters in the text.
-    Uses regex to detect emoji characters followed by spaces.
-    Only considers emoji matches longer than 1 character.
-
-    Args:
-        text: The input text containing emojis with spaces
-
-    Returns:
-        Text with spaces removed after each emoji
-    """
-    # Regex pattern to match any character that takes two code points followed by a space
-    emoji_space_pattern = regex.compile(r"([\U00010000-\U0010FFFF])\s")
-
-    # Find all emoji matches
-    result = text
-    for match in emoji_space_pattern.finditer(text):
-        # Replace the space after this emoji with empty string
-        pos = match.end(1)
-        if pos < len(result) and result[pos] == " ":
-            result = result[:pos] + result[pos + 1 :]
-
-    return result
-
-
-async def gen_telegram_digest(config, source_options=None):
+DEFAULT_MAX_CONCURRENT_CHANNELS = 4
+# Flood waits up to this long are slept through by Telethon itself
+DEFAULT_FLOOD_SLEEP_THRESHOLD = 60
+# Longer flood waits pause all channels, then the channel is retried
+DEFAULT_FLOOD_WAIT_RETRIES = 2
+DEFAULT_MAX_FLOOD_WAIT_SECONDS = 300
+DEFAULT_HISTORY_PAGE_SIZE = 100
+DEFAULT_MAX_HISTORY_PAGES = 10
+CURSORS_STATE_KEY = "telegram/cursors.json"
+SESSION_PATH = "/tmp/session_name.session"
+DEFAULT_USER_CACHE_HOURS = 168
+DEFAULT_USER_CACHE_MAX_ENTRIES = 5000
+
+
+async def gen_telegram_digest(config, source_options=None, global_config=None):
     res = ""
     res += "<h2>Telegram</h2>"
 
-    shutil.copyfile("session_name.session", "/tmp/session_name.session")
+    session_store = TelegramSessionStore(global_config, config)
+    await run_sync(session_store.restore, SESSION_PATH)
 
     async with TelegramClient(
-        "/tmp/session_name.session", config["api_id"], config["api_hash"]
+        SESSION_PATH,
+        config["api_id"],
+        config["api_hash"],
+        flood_sleep_threshold=config.get(
+            "flood_sleep_threshold", DEFAULT_FLOOD_SLEEP_THRESHOLD
+        ),
     ) as client:
-        channel_id_to_text = {}
+        # Id of the newest message already seen, per chat
+        cursors = None
+        if config.get("cursors", "yes") == "yes":
+            cursors = await run_sync(load_state, global_config, CURSORS_STATE_KEY, {})
+
+        user_cache = new_user_cache(global_config, config)
+        if config.get("user_cache", "yes") == "yes":
+            await run_sync(user_cache.load)
+
+        media_store = await TelegramMediaStore(global_config, config).load()
+        image_processor = InlineImageProcessor(config)
+        media_scheduler = MediaDownloadScheduler(
+            client, config, media_store, image_processor
+        )
+
+        channel_entities = []
 
         async for dialog in client.iter_dialogs():
             if (datetime.now().astimezone() - dialog.date).days >= 3:
                 print(f"Date too far: {dialog.date}, stopping")
                 break
 
-            channel_entity = await client.get_entity(dialog.id)
+            # The dialog already carries its entity, no need to resolve it again
+            channel_entity = dialog.entity
             if not isinstance(channel_entity, telethon.types.Chat) and not isinstance(
                 channel_entity, telethon.types.Channel
             ):
@@ -91,9 +80,23 @@ async def gen_telegram_digest(config, source_options=None):
             # if channel_entity.id != <id>:
             #     continue
 
-            channel_id_to_text[channel_entity.id] = await gen_telegram_channel_digest(
-                config, client, channel_entity
-            )
+            channel_entities.append(channel_entity)
+
+        channel_digests = await gen_telegram_channel_digests(
+            config,
+            client,
+            channel_entities,
+            cursors,
+            user_cache,
+            media_scheduler,
+        )
+        if config.get("user_cache", "yes") == "yes":
+            print(f"User cache: {user_cache.stats()}")
+            await run_sync(user_cache.save)
+        channel_id_to_text = {
+            channel_entity.id: text
+            for channel_entity, text in zip(channel_entities, channel_digests)
+        }
 
         # First add channels that are in config['channels']
         for channel in config["channels"]:
@@ -105,79 +108,242 @@ async def gen_telegram_digest(config, source_options=None):
             if channel_id not in [c["id"] for c in config["channels"]]:
                 res += text
 
+        res = await media_scheduler.fill(res)
+        await media_store.save()
+        if image_processor.inlined or image_processor.over_budget:
+            print(f"Inline images: {image_processor.stats()}")
+
+    # Only reached if the run succeeded, and the client has disconnected
+    await run_sync(session_store.save, SESSION_PATH)
+    if cursors is not None:
+        # Staged after every step that can fail, and saved only once the
+        # digest with these posts has been delivered
+        defer_state(global_config, CURSORS_STATE_KEY, cursors)
     return res
 
 
+async def gen_telegram_channel_digests(
+    config,
+    client,
+    channel_entities,
+    cursors=None,
+    user_cache=None,
+    media_scheduler=None,
+):
+    """
+    Generate digests for channels concurrently over the shared client.
+
+    A flood wait longer than Telethon's flood_sleep_threshold pauses every
+    channel until it is over, then the channel that hit it is retried.
+
+    Results are in the same order as channel_entities.
+    """
+    semaphore = asyncio.Semaphore(
+        config.get("max_concurrent_channels", DEFAULT_MAX_CONCURRENT_CHANNELS)
+    )
+    retries = config.get("flood_wait_retries", DEFAULT_FLOOD_WAIT_RETRIES)
+    max_flood_wait = config.get(
+        "max_flood_wait_seconds", DEFAULT_MAX_FLOOD_WAIT_SECONDS
+    )
+    loop = asyncio.get_running_loop()
+    paused_until = 0.0
+
+    async def run_limited(channel_entity):
+        nonlocal paused_until
+        for attempt in range(retries + 1):
+            async with semaphore:
+                delay = paused_until - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    return await gen_telegram_channel_digest(
+                        config,
+                        client,
+                        channel_entity,
+                        cursors,
+                        user_cache,
+                        media_scheduler,
+                    )
+                except FloodWaitError as e:
+                    if attempt == retries or e.seconds > max_flood_wait:
+                        print(
+                            f"Flood wait of {e.seconds}s for {channel_entity.title}, giving up"
+                        )
+                        return ""
+                    print(
+                        f"Flood wait of {e.seconds}s for {channel_entity.title}, pausing channels"
+                    )
+                    paused_until = max(paused_until, loop.time() + e.seconds)
+        return ""
+
+    return await asyncio.gather(*[run_limited(c) for c in channel_entities])
+
+
+def utf16_to_index(text: str) -> list[int]:
+    """
+    Map UTF-16 code unit offsets, which Telegram uses for entities, to
+    indexes into the Python string.
+
+    The result has an entry for every offset from 0 to the UTF-16 length
+    inclusive. An offset between the two halves of a surrogate pair maps to
+    the character after the pair.
+    """
+    index = []
+    for i, char in enumerate(text):
+        index.append(i)
+        if ord(char) > 0xFFFF:
+            index.append(i + 1)
+    index.append(len(text))
+    return index
+
+
+def entity_tags(entity, text: str) -> tuple[str, str] | None:
+    """Opening and closing HTML tag for an entity covering text, if supported."""
+    if isinstance(entity, telethon.types.MessageEntityBold):
+        return "<b>", "</b>"
+    if isinstance(entity, telethon.types.MessageEntityStrike):
+        return "<s>", "</s>"
+    if isinstance(entity, telethon.types.MessageEntityItalic):
+        return "<i>", "</i>"
+    if isinstance(entity, telethon.types.MessageEntityTextUrl):
+        return f"<a href='{entity.url}'>", "</a>"
+    if isinstance(entity, telethon.types.MessageEntityUrl):
+        return f"<a href='{text}'>", "</a>"
+    if isinstance(entity, telethon.types.MessageEntityMention):
+        # Remove @ from username
+        return f"<a href='https://t.me/{text[1:]}'>", "</a>"
+    print("Unknown entity: ", entity)
+    return None
+
+
 def format_telegram_message(post: telethon.tl.patched.Message) -> str:
     """
     Format a Telegram message by applying HTML formatting based on message entities.
     Also handles newline conversion to HTML breaks.
 
+    Entity offsets are converted from UTF-16 once, and the message is then
+    rendered in a single pass over the sorted entity boundaries. Nested
+    entities become nested tags; an entity that overlaps the end of another
+    one is closed and reopened around it so the HTML stays well-formed.
 
     Returns:
         Formatted message with HTML tags and line breaks
     """
     post_message = str(post.message)
 
-    # Insert spaces after emojis before processing entities
-    # Workaround for weird offset calculation
-    post_message = insert_spaces_after_emojis(post_message)
-
     if not post.entities:
         return post_message.replace("\n", "<br>\n")
 
-    # Tuples of (position, length)
-    offsets: list[tuple[int, int]] = []
-
-    for entity in sorted(post.entities, key=lambda e: e.offset):
-        offset_shift = 0
-        for o in offsets:
-            if entity.offset >= o[0]:
-                offset_shift += o[1]
-
-        start = entity.offset + offset_shift
-        end = start + entity.length
-
-        if isinstance(
-            entity,
-            (telethon.types.MessageEntityBold, telethon.types.MessageEntityStrike),
-        ):
-            tag = "b" if isinstance(entity, telethon.types.MessageEntityBold) else "s"
-            post_message = f"{post_message[:start]}<{tag}>{post_message[start:end]}</{tag}>{post_message[end:]}"
-            offsets.append((entity.offset, len(f"<{tag}>")))
-            offsets.append((entity.offset + entity.length, len(f"</{tag}>")))
-        elif isinstance(entity, telethon.types.MessageEntityItalic):
-            post_message = f"{post_message[:start]}<i>{post_message[start:end]}</i>{post_message[end:]}"
-            offsets.append((entity.offset, len("<i>")))
-            offsets.append((entity.offset + entity.length, len("</i>")))
-        elif isinstance(
-            entity,
-            (telethon.types.MessageEntityUrl, telethon.types.MessageEntityTextUrl),
-        ):
-            url = (
-                entity.url
-                if isinstance(entity, telethon.types.MessageEntityTextUrl)
-                else post_message[start:end]
-            )
-            text = post_message[start:end]
-            post_message = (
-                f"{post_message[:start]}<a href='{url}'>{text}</a>{post_message[end:]}"
-            )
-            offsets.append((entity.offset, len(f"<a href='{url}'>")))
-            offsets.append((entity.offset + entity.length, len("</a>")))
-        elif isinstance(entity, telethon.types.MessageEntityMention):
-            username = post_message[start:end]
-            url = f"https://t.me/{username[1:]}"  # Remove @ from username
-            post_message = f"{post_message[:start]}<a href='{url}'>{username}</a>{post_message[end:]}"
-            offsets.append((entity.offset, len(f"<a href='{url}'>")))
-            offsets.append((entity.offset + entity.length, len("</a>")))
-        else:
-            print("Unknown entity: ", entity)
+    index = utf16_to_index(post_message)
+    last = len(index) - 1
+
+    # (start, end, order, open tag, close tag)
+    spans = []
+    for order, entity in enumerate(sorted(post.entities, key=lambda e: e.offset)):
+        start = index[min(entity.offset, last)]
+        end = index[min(entity.offset + entity.length, last)]
+        tags = entity_tags(entity, post_message[start:end])
+        if tags is not None and start < end:
+            spans.append((start, end, order, *tags))
+
+    # Outer entities open first: earlier start, then longer
+    opens = sorted(spans, key=lambda s: (s[0], -s[1], s[2]))
+    ends = sorted(spans, key=lambda s: s[1])
+
+    parts = []
+    stack = []
+    position = 0
+    next_open = 0
+    next_end = 0
+    while next_open < len(opens) or next_end < len(ends):
+        boundary = min(
+            opens[next_open][0] if next_open < len(opens) else len(post_message),
+            ends[next_end][1] if next_end < len(ends) else len(post_message),
+        )
+        parts.append(post_message[position:boundary])
+        position = boundary
+
+        # Close everything ending here, innermost first. Spans above it on
+        # the stack that go on past this point are reopened afterwards.
+        closing = set()
+        while next_end < len(ends) and ends[next_end][1] == boundary:
+            closing.add(ends[next_end])
+            next_end += 1
+        if closing:
+            depth = min(i for i, span in enumerate(stack) if span in closing)
+            reopen = []
+            while len(stack) > depth:
+                span = stack.pop()
+                parts.append(span[4])
+                if span not in closing:
+                    reopen.append(span)
+            for span in reversed(reopen):
+                parts.append(span[3])
+                stack.append(span)
+
+        while next_open < len(opens) and opens[next_open][0] == boundary:
+            span = opens[next_open]
+            parts.append(span[3])
+            stack.append(span)
+            next_open += 1
+
+    parts.append(post_message[position:])
+    return "".join(parts).replace("\n", "<br>\n")
+
+
+async def fetch_channel_history(
+    config, client, channel_entity, days_to_take: int, min_id: int = 0
+) -> tuple[list[telethon.tl.patched.Message], list[telethon.types.User]]:
+    """
+    Fetch the messages of a chat newer than min_id, newest first, along with
+    the users who wrote them.
 
-    return remove_spaces_after_emojis(post_message).replace("\n", "<br>\n")
+    Pages back through the history until a message older than days_to_take
+    days shows up, so quiet chats take a single request and busy ones
+    aren't cut off at the page size.
+    """
+    page_size = config.get("history_page_size", DEFAULT_HISTORY_PAGE_SIZE)
+    max_pages = config.get("max_history_pages", DEFAULT_MAX_HISTORY_PAGES)
+
+    messages = []
+    users = []
+    offset_id = 0
+    for _ in range(max_pages):
+        posts = await client(
+            GetHistoryRequest(
+                peer=channel_entity,
+                limit=page_size,
+                offset_date=None,
+                offset_id=offset_id,
+                max_id=0,
+                min_id=min_id,
+                add_offset=0,
+                hash=0,
+            )
+        )
+        messages.extend(posts.messages)
+        users.extend(posts.users)
+        if len(posts.messages) < page_size:
+            return messages, users
+        oldest = posts.messages[-1]
+        if (datetime.now().astimezone() - oldest.date).days >= days_to_take:
+            return messages, users
+        offset_id = oldest.id
+
+    print(
+        f"Stopped paging {channel_entity.title} after {max_pages} pages, older posts are skipped"
+    )
+    return messages, users
 
 
-async def gen_telegram_channel_digest(config, client, channel_entity):
+async def gen_telegram_channel_digest(
+    config,
+    client,
+    channel_entity,
+    cursors=None,
+    user_cache=None,
+    media_scheduler=None,
+):
     res = ""
     print(f"Processing chat: {channel_entity.title}, channel id: {channel_entity.id}")
     if channel_entity.id in config["except_chat_ids"]:
@@ -209,37 +375,39 @@ async def gen_telegram_channel_digest(config, client, channel_entity):
         else {}
     )
     include_filters = filters["include"] if "include" in filters else []
-
-    posts = await client(
-        GetHistoryRequest(
-            peer=channel_entity,
-            limit=100,
-            offset_date=None,
-            offset_id=0,
-            max_id=0,
-            min_id=0,
-            add_offset=0,
-            hash=0,
+    # Without a run-wide scheduler, photos are downloaded when this chat is done
+    own_scheduler = media_scheduler is None
+    if own_scheduler:
+        media_scheduler = MediaDownloadScheduler(
+            client, config, image_processor=InlineImageProcessor(config)
         )
+    media_mode = get_media_mode(
+        config, channel_config, channel_entity, media_scheduler.media_store
+    )
+
+    days_to_take = days_since_last_included_day(current_day, days)
+    if (
+        channel_config is not None
+        and "include_days_since_last" in channel_config
+        and channel_config["include_days_since_last"] == "no"
+    ):
+        days_to_take = 1
+
+    min_id = cursors.get(str(channel_entity.id), 0) if cursors is not None else 0
+    messages, users = await fetch_channel_history(
+        config, client, channel_entity, days_to_take, min_id
     )
+    if user_cache is None:
+        user_cache = new_user_cache(None, config)
+    # Authors come with the history, so most of them never need a lookup
+    for user in users:
+        user_cache.set(str(user.id), telegram_user_record(config, user))
     posts_str = ""
     total_posts = 0
 
     selected_posts: list[telethon.tl.patched.Message] = []
-    for post in posts.messages:
+    for post in messages:
         ago = datetime.now().astimezone() - post.date
-        days = (
-            channel_config["days"]
-            if channel_config is not None and "days" in channel_config
-            else config.get("default_days", default_days())
-        )
-        days_to_take = days_since_last_included_day(current_day, days)
-        if (
-            channel_config is not None
-            and "include_days_since_last" in channel_config
-            and channel_config["include_days_since_last"] == "no"
-        ):
-            days_to_take = 1
         if ago.days >= days_to_take:
             break
         if include_filters:
@@ -256,25 +424,28 @@ async def gen_telegram_channel_digest(config, client, channel_entity):
 
         if hasattr(post, "from_id") and hasattr(post.from_id, "user_id"):
             user_id = post.from_id.user_id  # type: ignore
-            full_user = await get_telegram_user(client, user_id)
+            full_user = await get_telegram_user(config, client, user_id, user_cache)
         else:
             user_id = "undefined"
             full_user = None
 
         user_info_suffix = ""
         if full_user is not None:
-            if full_user.username in config["silenced_user_ids"]:
-                posts_str += f"<span><i>Silenced user: {full_user.username}</i></span>"
+            if full_user["silenced"]:
+                posts_str += (
+                    f"<span><i>Silenced user: {full_user['username']}</i></span>"
+                )
                 posts_str += "<br>\n"
                 continue
-            user_info_suffix += f" - {full_user.username}"
-            if full_user.first_name is not None:
-                user_info_suffix += f" ({full_user.first_name}"
-                if full_user.last_name is not None:
-                    user_info_suffix += f" {full_user.last_name}"
+            user_info_suffix += f" - {full_user['username']}"
+            if full_user["first_name"] is not None:
+                user_info_suffix += f" ({full_user['first_name']}"
+                if full_user["last_name"] is not None:
+                    user_info_suffix += f" {full_user['last_name']}"
                 user_info_suffix += f")"
 
         posts_str += f"<b>{str(post.date)}{user_info_suffix}</b>" + "<br>\n"
+        url = None
         if hasattr(channel_entity, "username") and channel_entity.username is not None:
             usr = channel_entity.username
             url = "https://t.me/" + str(usr) + "/" + str(post.id)
@@ -284,9 +455,7 @@ async def gen_telegram_channel_digest(config, client, channel_entity):
         posts_str += post_message
         posts_str += "<br>\n"
 
-        media_tag = await get_post_media_tag(
-            client, post, no_media=channel_entity.id in config["no_media"]
-        )
+        media_tag = get_post_media_tag(post, media_mode, media_scheduler, post_url=url)
         posts_str += media_tag
 
         if len(str(post.message)) == 0 and len(media_tag) == 0:
@@ -294,35 +463,100 @@ async def gen_telegram_channel_digest(config, client, channel_entity):
 
         posts_str += "<br>\n"
 
+    # Only once the digest is done: a retried chat must fetch the same posts
+    if cursors is not None and messages:
+        cursors[str(channel_entity.id)] = max(min_id, messages[0].id)
+
     if total_posts == 0:
         print(f"Chat with no messages: {channel_entity.title}, id={channel_entity.id}.")
         return ""
     else:
         res += f"<h4>{channel_entity.title} ({total_posts} item(s), id={channel_entity.id})</h4>"
         res += posts_str
+    if own_scheduler:
+        res = await media_scheduler.fill(res)
     return res
 
 
-telegram_users_cache = {}
+def new_user_cache(global_config, config) -> PersistentCache:
+    return PersistentCache(
+        global_config,
+        "telegram/users.json",
+        max_entries=config.get(
+            "user_cache_max_entries", DEFAULT_USER_CACHE_MAX_ENTRIES
+        ),
+        default_ttl=config.get("user_cache_hours", DEFAULT_USER_CACHE_HOURS) * 3600,
+    )
+
+
+def silenced_users_fingerprint(config) -> str:
+    return hashlib.sha1(
+        "\n".join(sorted(map(str, config["silenced_user_ids"]))).encode("utf-8")
+    ).hexdigest()[:12]
+
+
+def telegram_user_record(config, user: telethon.types.User) -> dict:
+    """The parts of a user the digest needs, including whether it is silenced."""
+    return {
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "silenced": user.username in config["silenced_user_ids"],
+        "silenced_fingerprint": silenced_users_fingerprint(config),
+    }
+
 
+async def get_telegram_user(config, client, user_id, user_cache: PersistentCache):
+    record = user_cache.get(str(user_id))
+    if record is not None:
+        if record["silenced_fingerprint"] != silenced_users_fingerprint(config):
+            # silenced_user_ids changed since the decision was stored
+            record = dict(
+                record,
+                silenced=record["username"] in config["silenced_user_ids"],
+                silenced_fingerprint=silenced_users_fingerprint(config),
+            )
+            user_cache.set(str(user_id), record)
+        return record
 
-async def get_telegram_user(client, user_id):
-    if user_id in telegram_users_cache:
-        return telegram_users_cache[user_id]
     users = await client(GetFullUserRequest(user_id))
     if len(users.users) < 1:
-        result = None
-    else:
-        result = users.users[0]
-    telegram_users_cache[user_id] = result
-    return result
+        return None
+    record = telegram_user_record(config, users.users[0])
+    user_cache.set(str(user_id), record)
+    return record
 
 
 def default_days():
     return [1, 2, 3, 4, 5, 6, 7]
 
 
-async def get_post_media_tag(client, post, no_media=False):
+def get_media_mode(config, channel_config, channel_entity, media_store=None) -> str:
+    """
+    How photos of a chat are included: "store" (link to the media store),
+    "inline" (embedded as base64) or "none".
+
+    Set with media_mode, per channel or for the whole source; chats in
+    no_media get "none". The default is "store" only if media_store.base_url
+    is set, since presigned URLs stop working after a week. "store" needs S3
+    and falls back to "inline".
+    """
+    if channel_entity.id in config["no_media"]:
+        return "none"
+    has_base_url = media_store is not None and bool(media_store.base_url)
+    media_mode = config.get("media_mode", "store" if has_base_url else "inline")
+    if channel_config is not None and "media_mode" in channel_config:
+        media_mode = channel_config["media_mode"]
+    if media_mode == "store" and (media_store is None or not media_store.available):
+        return "inline"
+    return media_mode
+
+
+def get_post_media_tag(post, media_mode, media_scheduler, post_url=None):
+    """
+    Tag for the media of a post. Photos are registered with media_scheduler
+    and get a placeholder that MediaDownloadScheduler.fill() replaces.
+    """
     if post.audio is not None:
         return "<span><i>Unsupported message type: audio</i></span>"
     if post.gif is not None:
@@ -340,7 +574,7 @@ async def get_post_media_tag(client, post, no_media=False):
 
     if post.photo is None:
         return ""
-    if no_media:
+    if media_mode == "none":
         return "<span><i>Not including media for this channel</i></span>"
 
     ext_to_mime = {
@@ -357,7 +591,4 @@ async def get_post_media_tag(client, post, no_media=False):
         if hasattr(size, "w") and size.w <= PREFERRED_MAX_IMAGE_WITH:
             thumb = i
 
-    blob = await client.download_media(post, bytes, thumb=thumb)
-    encoded = base64.b64encode(blob).decode("utf-8")
-
-    return f'<img src="data:{mime};base64, {encoded}" alt="Image"/>'
+    return media_scheduler.add(post, thumb, mime, media_mode, post_url)
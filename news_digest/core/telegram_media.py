@@ -0,0 +1,394 @@
+import asyncio
+import base64
+import hashlib
+import io
+import re
+import secrets
+import time
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from news_digest.utils.state import PersistentCache, _get_s3_client
+from news_digest.utils.sync_pool import run_sync
+from news_digest.utils.util import PREFERRED_MAX_IMAGE_WITH, gen_href
+
+DEFAULT_MEDIA_PREFIX = "media/telegram/"
+# Presigned URLs can't be valid for longer than a week
+DEFAULT_URL_EXPIRES_DAYS = 7
+DEFAULT_INDEX_TTL_DAYS = 30
+DEFAULT_INDEX_MAX_ENTRIES = 20000
+DEFAULT_IMAGE_FORMAT = "jpeg"
+DEFAULT_IMAGE_QUALITY = 75
+DEFAULT_INLINE_IMAGE_BUDGET_KB = 2048
+IMAGE_FORMAT_MIME = {"jpeg": "image/jpeg", "webp": "image/webp"}
+DEFAULT_MAX_CONCURRENT_DOWNLOADS = 8
+
+
+class TelegramMediaStore:
+    """
+    Content-addressed store for Telegram photos in the S3 bucket.
+
+    Each photo is written once under a key derived from the SHA-256 of its
+    bytes, so a photo forwarded to several chats is stored once. An index of
+    Telegram photo id -> key is kept between runs, so a photo that has
+    already been stored isn't downloaded again at all.
+
+    Digests link to the stored object: under media_store.base_url if set
+    (e.g. a CloudFront distribution for the bucket), otherwise with a
+    presigned URL.
+    """
+
+    def __init__(self, global_config: Optional[Dict[str, Any]], config: Dict[str, Any]):
+        self.s3_config = (global_config or {}).get("s3")
+        store_config = config.get("media_store", {})
+        self.prefix = store_config.get("prefix", DEFAULT_MEDIA_PREFIX)
+        self.base_url = store_config.get("base_url")
+        self.url_expires = (
+            store_config.get("url_expires_days", DEFAULT_URL_EXPIRES_DAYS) * 24 * 3600
+        )
+        self.index = PersistentCache(
+            global_config,
+            "telegram/media.json",
+            max_entries=store_config.get(
+                "index_max_entries", DEFAULT_INDEX_MAX_ENTRIES
+            ),
+            default_ttl=store_config.get("index_ttl_days", DEFAULT_INDEX_TTL_DAYS)
+            * 24
+            * 3600,
+        )
+        self.uploaded = 0
+        self.bytes_uploaded = 0
+
+    @property
+    def available(self) -> bool:
+        return bool(self.s3_config)
+
+    async def load(self) -> "TelegramMediaStore":
+        if self.available:
+            await run_sync(self.index.load)
+        return self
+
+    async def save(self):
+        if self.available:
+            print(f"Media store: {self.stats()}")
+            await run_sync(self.index.save)
+
+    def stats(self) -> str:
+        return (
+            f"{self.uploaded} uploaded ({self.bytes_uploaded / 1024:.0f} KB), "
+            f"index {self.index.stats()}"
+        )
+
+    def lookup(self, photo_key: str) -> Optional[str]:
+        """URL of an already stored photo, by media_photo_key(), if any."""
+        key = self.index.get(photo_key)
+        return self.url_for(key) if key is not None else None
+
+    async def store(self, photo_key: str, blob: bytes, ext: str, mime: str) -> str:
+        """Store a downloaded photo and return its URL."""
+        key = await run_sync(self.put, blob, ext, mime)
+        self.index.set(photo_key, key)
+        return self.url_for(key)
+
+    def put(self, blob: bytes, ext: str, mime: str) -> str:
+        """Store blob under its content hash unless it's already there."""
+        key = f"{self.prefix}{hashlib.sha256(blob).hexdigest()}{ext}"
+        s3 = _get_s3_client(self.s3_config.get("region"))
+        try:
+            s3.head_object(Bucket=self.s3_config["bucket"], Key=key)
+            return key
+        except ClientError:
+            pass
+        s3.put_object(
+            Bucket=self.s3_config["bucket"],
+            Key=key,
+            Body=blob,
+            ContentType=mime,
+            # The key changes whenever the content does
+            CacheControl="public, max-age=31536000, immutable",
+        )
+        self.uploaded += 1
+        self.bytes_uploaded += len(blob)
+        return key
+
+    def url_for(self, key: str) -> str:
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{key}"
+        s3 = _get_s3_client(self.s3_config.get("region"))
+        return s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.s3_config["bucket"], "Key": key},
+            ExpiresIn=self.url_expires,
+        )
+
+
+class InlineImageProcessor:
+    """
+    Re-encodes photos that are embedded in the digest and keeps their total
+    size within a per-digest budget.
+
+    Photos are converted to image_processing.format (progressive JPEG or
+    WebP) at the configured quality in a worker thread; the original is kept
+    if re-encoding doesn't make it smaller. Once the budget is used up,
+    admit() fails and the caller links to the photo instead.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        processing_config = config.get("image_processing", {})
+        self.enabled = processing_config.get("enabled", "yes") == "yes"
+        self.format = processing_config.get("format", DEFAULT_IMAGE_FORMAT)
+        self.quality = processing_config.get("quality", DEFAULT_IMAGE_QUALITY)
+        self.max_width = processing_config.get("max_width", PREFERRED_MAX_IMAGE_WITH)
+        self.budget = (
+            config.get("inline_image_budget_kb", DEFAULT_INLINE_IMAGE_BUDGET_KB) * 1024
+        )
+        self.used = 0
+        self.original_bytes = 0
+        self.encoded_bytes = 0
+        self.inlined = 0
+        self.over_budget = 0
+
+    def recompress(self, blob: bytes, mime: str) -> tuple[bytes, str]:
+        """Re-encode blob, returning whichever of it and the original is smaller."""
+        try:
+            # Imported here so a build without Pillow still renders digests
+            from PIL import Image
+        except ImportError:
+            if self.enabled:
+                print("Pillow is not installed, inlining photos as they are")
+                self.enabled = False
+            return blob, mime
+        try:
+            with Image.open(io.BytesIO(blob)) as image:
+                image.thumbnail((self.max_width, self.max_width * 4))
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                out = io.BytesIO()
+                if self.format == "webp":
+                    image.save(out, "WEBP", quality=self.quality, method=4)
+                else:
+                    image.save(
+                        out,
+                        "JPEG",
+                        quality=self.quality,
+                        optimize=True,
+                        progressive=True,
+                    )
+        except Exception as e:
+            print(f"Failed to recompress image: {e}")
+            return blob, mime
+        encoded = out.getvalue()
+        if len(encoded) >= len(blob):
+            return blob, mime
+        return encoded, IMAGE_FORMAT_MIME[self.format]
+
+    async def encode(self, blob: bytes, mime: str) -> tuple[bytes, str]:
+        if not self.enabled:
+            return blob, mime
+        return await run_sync(self.recompress, blob, mime)
+
+    def admit(self, original_size: int, blob: bytes, mime: str) -> Optional[str]:
+        """
+        data: URI for an encoded photo, or None if it doesn't fit in what's
+        left of the budget.
+        """
+        data_uri = f"data:{mime};base64, {base64.b64encode(blob).decode('utf-8')}"
+        if self.used + len(data_uri) > self.budget:
+            self.over_budget += 1
+            return None
+        self.used += len(data_uri)
+        self.inlined += 1
+        self.original_bytes += original_size
+        self.encoded_bytes += len(blob)
+        return data_uri
+
+    def stats(self) -> str:
+        saved = self.original_bytes - self.encoded_bytes
+        return (
+            f"{self.inlined} inlined, {self.original_bytes / 1024:.0f} KB -> "
+            f"{self.encoded_bytes / 1024:.0f} KB (saved {saved / 1024:.0f} KB), "
+            f"{self.over_budget} over the {self.budget / 1024:.0f} KB budget, "
+            f"{self.used / 1024:.0f} KB used"
+        )
+
+
+def media_photo_key(post, thumb) -> str:
+    return f"{post.photo.id}:{thumb}"
+
+
+class MediaDownloadScheduler:
+    """
+    Downloads the photos of a whole run concurrently.
+
+    Rendering a post only registers its photo with add(), which returns a
+    placeholder to put in the digest. fill() then downloads every photo the
+    digest still references, at most max_concurrent_downloads at a time and
+    each distinct photo once (forwards share a photo id), and replaces the
+    placeholders with the final tags. Photos already in the media store are
+    not downloaded at all.
+    """
+
+    def __init__(
+        self,
+        client,
+        config: Dict[str, Any],
+        media_store: Optional[TelegramMediaStore] = None,
+        image_processor: Optional[InlineImageProcessor] = None,
+    ):
+        self.client = client
+        self.media_store = media_store
+        self.image_processor = image_processor
+        self.max_concurrent = config.get(
+            "max_concurrent_downloads", DEFAULT_MAX_CONCURRENT_DOWNLOADS
+        )
+        # Message text isn't escaped, so placeholders must be unguessable
+        self.token = secrets.token_hex(8)
+        self.pattern = re.compile(f"<!--telegram-media-{self.token}-(\\d+)-->")
+        self.jobs: List[Dict[str, Any]] = []
+
+    def add(self, post, thumb, mime: str, media_mode: str, post_url=None) -> str:
+        self.jobs.append(
+            {
+                "post": post,
+                "thumb": thumb,
+                "mime": mime,
+                "media_mode": media_mode,
+                "post_url": post_url,
+            }
+        )
+        return f"<!--telegram-media-{self.token}-{len(self.jobs) - 1}-->"
+
+    async def fill(self, text: str) -> str:
+        used = sorted({int(i) for i in self.pattern.findall(text)})
+        if not used:
+            return text
+        tags = await self._resolve(used)
+        return self.pattern.sub(lambda m: tags[int(m.group(1))], text)
+
+    async def _resolve(self, job_ids: List[int]) -> Dict[int, str]:
+        stored: Dict[str, str] = {}
+        to_download: Dict[str, Dict[str, Any]] = {}
+        for i in job_ids:
+            job = self.jobs[i]
+            photo_key = media_photo_key(job["post"], job["thumb"])
+            if job["media_mode"] == "store":
+                if photo_key in stored:
+                    continue
+                url = self.media_store.lookup(photo_key)
+                if url is not None:
+                    stored[photo_key] = url
+                    continue
+            to_download.setdefault(photo_key, job)
+
+        start = time.perf_counter()
+        blobs = await self._download_all(to_download)
+        print(
+            f"Media: {len(job_ids)} photo(s), {len(to_download)} downloaded "
+            f"in {time.perf_counter() - start:.1f}s, "
+            f"{len(job_ids) - len(to_download)} reused"
+        )
+
+        # Upload each distinct stored photo once, concurrently
+        store_keys = [
+            k
+            for k in self._photo_keys(job_ids, "store")
+            if k not in stored and blobs.get(k) is not None
+        ]
+        urls = await asyncio.gather(
+            *[self._store(k, to_download[k], blobs[k]) for k in store_keys]
+        )
+        # Photos that failed to upload are inlined instead
+        stored.update((k, url) for k, url in zip(store_keys, urls) if url is not None)
+
+        # Re-encode each distinct inlined photo once, concurrently
+        encoded: Dict[str, tuple[bytes, str]] = {}
+        if self.image_processor is not None:
+            keys = [
+                k
+                for k in self._photo_keys(job_ids, "inline")
+                if blobs.get(k) is not None
+            ]
+            results = await asyncio.gather(
+                *[
+                    self.image_processor.encode(blobs[k], to_download[k]["mime"])
+                    for k in keys
+                ]
+            )
+            encoded = dict(zip(keys, results))
+
+        tags = {}
+        # In digest order, so the inline budget goes to the first photos
+        for i in job_ids:
+            job = self.jobs[i]
+            photo_key = media_photo_key(job["post"], job["thumb"])
+            if photo_key in stored and job["media_mode"] == "store":
+                tags[i] = f'<img src="{stored[photo_key]}" alt="Image"/>'
+                continue
+            blob = blobs.get(photo_key)
+            if blob is None:
+                tags[i] = "<span><i>Failed to download image</i></span>"
+            else:
+                tags[i] = await self._inline_tag(photo_key, job, blob, encoded, stored)
+        return tags
+
+    def _photo_keys(self, job_ids: List[int], media_mode: str) -> List[str]:
+        keys = [
+            media_photo_key(self.jobs[i]["post"], self.jobs[i]["thumb"])
+            for i in job_ids
+            if self.jobs[i]["media_mode"] == media_mode
+        ]
+        return list(dict.fromkeys(keys))
+
+    async def _download_all(self, to_download: Dict[str, Dict[str, Any]]):
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def download(job):
+            async with semaphore:
+                try:
+                    return await self.client.download_media(
+                        job["post"], bytes, thumb=job["thumb"]
+                    )
+                except Exception as e:
+                    print(f"Failed to download photo of post {job['post'].id}: {e}")
+                    return None
+
+        results = await asyncio.gather(*[download(j) for j in to_download.values()])
+        return dict(zip(to_download, results))
+
+    async def _store(self, photo_key, job, blob) -> Optional[str]:
+        try:
+            return await self.media_store.store(
+                photo_key, blob, job["post"].file.ext, job["mime"]
+            )
+        except Exception as e:
+            print(f"Failed to store photo of post {job['post'].id}: {e}")
+            return None
+
+    async def _inline_tag(self, photo_key, job, blob, encoded, stored) -> str:
+        if self.image_processor is None:
+            encoded_blob = base64.b64encode(blob).decode("utf-8")
+            return f'<img src="data:{job["mime"]};base64, {encoded_blob}" alt="Image"/>'
+
+        if photo_key not in encoded:
+            # A stored photo whose upload failed
+            encoded[photo_key] = await self.image_processor.encode(blob, job["mime"])
+        data_uri = self.image_processor.admit(len(blob), *encoded[photo_key])
+        if data_uri is not None:
+            return f'<img src="{data_uri}" alt="Image"/>'
+
+        # Over the inline image budget: link to the photo instead. Presigned
+        # URLs expire, so without a base_url the Telegram post is preferred.
+        store_url = None
+        if self.media_store is not None and self.media_store.available:
+            if self.media_store.base_url or job["post_url"] is None:
+                if photo_key not in stored:
+                    url = await self._store(photo_key, job, blob)
+                    if url is not None:
+                        stored[photo_key] = url
+                store_url = stored.get(photo_key)
+        if store_url is not None:
+            return f"<span><i>Image: {gen_href('open', store_url)}</i></span>"
+        if job["post_url"] is not None:
+            return f"<span><i>Image: {gen_href('open in Telegram', job['post_url'])}</i></span>"
+        return "<span><i>Image not included, inline image budget used up</i></span>"
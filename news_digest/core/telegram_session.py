@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from boto3.exceptions import Boto3Error
+from botocore.exceptions import BotoCoreError, ClientError
+
+from news_digest.utils.state import _get_s3_client
+
+BUNDLED_SESSION_PATH = "session_name.session"
+DEFAULT_SESSION_PREFIX = "telegram/session/"
+DEFAULT_SESSION_VERSIONS = 5
+DEFAULT_SESSION_SSE = "AES256"
+
+# upload_file raises S3UploadFailedError, a Boto3Error rather than a ClientError
+S3_ERRORS = (ClientError, BotoCoreError, Boto3Error)
+
+
+def file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def sqlite_integrity_ok(path: str) -> bool:
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = connection.execute("PRAGMA integrity_check").fetchone()
+            # Telethon's session has a sessions table with the auth key
+            connection.execute("SELECT auth_key FROM sessions").fetchall()
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print(f"Session file {path} is not a usable SQLite database: {e}")
+        return False
+    return result is not None and result[0] == "ok"
+
+
+class TelegramSessionStore:
+    """
+    Keeps the Telethon session file, and with it Telethon's entity and
+    access hash cache, in the S3 bucket between runs.
+
+    Every save uploads a new immutable version and then swaps a small
+    pointer object (latest.json) listing the last few versions with their
+    SHA-256, so a reader never sees a half-written session. restore() takes
+    the newest version that passes the hash and SQLite integrity checks and
+    falls back to the session bundled with the code.
+
+    The session holds the account's auth key, so storing it is opt-in and
+    needs session_store.bucket. The digest bucket is only accepted with an
+    explicit session_store.prefix, which must not be publicly readable.
+    Objects are written with server-side encryption.
+    """
+
+    def __init__(self, global_config: Optional[Dict[str, Any]], config: Dict[str, Any]):
+        store_config = config.get("session_store", {})
+        digest_s3_config = (global_config or {}).get("s3") or {}
+        self.s3_config = {
+            "bucket": store_config.get("bucket"),
+            "region": store_config.get("region", digest_s3_config.get("region")),
+        }
+        self.prefix = store_config.get("prefix", DEFAULT_SESSION_PREFIX)
+        self.max_versions = store_config.get("versions", DEFAULT_SESSION_VERSIONS)
+        self.encryption_args = {
+            "ServerSideEncryption": store_config.get("sse", DEFAULT_SESSION_SSE)
+        }
+        if "kms_key_id" in store_config:
+            self.encryption_args["SSEKMSKeyId"] = store_config["kms_key_id"]
+        self.restored_sha256: Optional[str] = None
+
+        self.enabled = store_config.get("enabled", "no") == "yes"
+        if self.enabled and not self.s3_config["bucket"]:
+            print("Telegram session store needs session_store.bucket, not storing")
+            self.enabled = False
+        elif (
+            self.enabled
+            and self.s3_config["bucket"] == digest_s3_config.get("bucket")
+            and "prefix" not in store_config
+        ):
+            print(
+                "Telegram session store uses the digest bucket, set a private "
+                "session_store.prefix; not storing"
+            )
+            self.enabled = False
+
+    @property
+    def pointer_key(self) -> str:
+        return f"{self.prefix}latest.json"
+
+    def _s3(self):
+        return _get_s3_client(self.s3_config.get("region"))
+
+    def _load_pointer(self) -> Dict[str, Any]:
+        try:
+            response = self._s3().get_object(
+                Bucket=self.s3_config["bucket"], Key=self.pointer_key
+            )
+            pointer = json.loads(response["Body"].read().decode("utf-8"))
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                print(f"Failed to load session pointer: {e}")
+            return {"versions": []}
+        except (BotoCoreError, Boto3Error, ValueError) as e:
+            print(f"Failed to load session pointer: {e}")
+            return {"versions": []}
+        if not isinstance(pointer, dict) or not isinstance(
+            pointer.get("versions"), list
+        ):
+            print("Session pointer has no version list, ignoring it")
+            return {"versions": []}
+        return pointer
+
+    def restore(self, path: str) -> str:
+        """
+        Put the session at path, preferring the newest good stored version.
+
+        Returns:
+            str: The S3 key the session came from, or the bundled file path
+        """
+        if self.enabled:
+            versions: List[Dict[str, Any]] = self._load_pointer().get("versions", [])
+            for version in versions:
+                try:
+                    restored = self._download_version(version, path)
+                except (KeyError, TypeError) as e:
+                    print(f"Skipping malformed session version {version}: {e}")
+                    continue
+                if restored:
+                    self.restored_sha256 = version["sha256"]
+                    print(f"Restored Telegram session from {version['key']}")
+                    return version["key"]
+
+        shutil.copyfile(BUNDLED_SESSION_PATH, path)
+        print(f"Using bundled Telegram session {BUNDLED_SESSION_PATH}")
+        return BUNDLED_SESSION_PATH
+
+    def _download_version(self, version: Dict[str, Any], path: str) -> bool:
+        download_path = f"{path}.download"
+        try:
+            self._s3().download_file(
+                self.s3_config["bucket"], version["key"], download_path
+            )
+        except S3_ERRORS as e:
+            print(f"Failed to download session {version['key']}: {e}")
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            return False
+
+        if file_sha256(download_path) != version["sha256"]:
+            print(f"Session {version['key']} doesn't match its checksum, skipping")
+            os.remove(download_path)
+            return False
+        if not sqlite_integrity_ok(download_path):
+            os.remove(download_path)
+            return False
+        os.replace(download_path, path)
+        return True
+
+    def save(self, path: str) -> bool:
+        """
+        Upload the session at path as a new version. Only call after a
+        successful run, once the client has disconnected.
+        """
+        if not self.enabled:
+            return False
+
+        snapshot_path = f"{path}.snapshot"
+        try:
+            # A consistent copy, even if something still has the database open
+            try:
+                source = sqlite3.connect(path)
+                target = sqlite3.connect(snapshot_path)
+                try:
+                    source.backup(target)
+                finally:
+                    source.close()
+                    target.close()
+            except sqlite3.Error as e:
+                print(f"Failed to snapshot Telegram session: {e}")
+                return False
+
+            if not sqlite_integrity_ok(snapshot_path):
+                print("Not saving Telegram session, integrity check failed")
+                return False
+            sha256 = file_sha256(snapshot_path)
+            if sha256 == self.restored_sha256:
+                print("Telegram session unchanged, not saving")
+                return True
+            return self._upload_version(snapshot_path, sha256)
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+    def _upload_version(self, snapshot_path: str, sha256: str) -> bool:
+        bucket = self.s3_config["bucket"]
+        version = {
+            "key": f"{self.prefix}versions/{int(time.time())}-{sha256[:16]}.session",
+            "sha256": sha256,
+            "size": os.path.getsize(snapshot_path),
+            "saved_at": time.time(),
+        }
+        try:
+            s3 = self._s3()
+            s3.upload_file(
+                snapshot_path,
+                bucket,
+                version["key"],
+                ExtraArgs={"Metadata": {"sha256": sha256}, **self.encryption_args},
+            )
+            # The pointer only moves once the new version is fully uploaded
+            versions = [version] + self._load_pointer().get("versions", [])
+            kept, dropped = (
+                versions[: self.max_versions],
+                versions[self.max_versions :],
+            )
+            s3.put_object(
+                Bucket=bucket,
+                Key=self.pointer_key,
+                Body=json.dumps({"versions": kept}, indent=2),
+                ContentType="application/json",
+                **self.encryption_args,
+            )
+        except (*S3_ERRORS, ValueError) as e:
+            print(f"Failed to save Telegram session: {e}")
+            return False
+
+        for old in dropped:
+            try:
+                s3.delete_object(Bucket=bucket, Key=old["key"])
+            except (*S3_ERRORS, KeyError, TypeError) as e:
+                print(f"Failed to delete old session {old}: {e}")
+        self.restored_sha256 = sha256
+        print(f"Saved Telegram session to {version['key']}")
+        return True
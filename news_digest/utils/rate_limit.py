@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+# Requests per second and burst size per host. Hosts not listed here use
+# DEFAULT_HOST_LIMIT, each with its own bucket.
+DEFAULT_HOST_LIMITS: Dict[str, Dict[str, float]] = {
+    "www.365chess.com": {"rate": 1, "burst": 1},
+    "api.chesstools.org": {"rate": 2, "burst": 2},
+    "hacker-news.firebaseio.com": {"rate": 50, "burst": 20},
+}
+DEFAULT_HOST_LIMIT: Dict[str, float] = {"rate": 2, "burst": 4}
+
+_limiter: Optional["HostRateLimiter"] = None
+_limits_config: Dict[str, Any] = {}
+
+
+class TokenBucket:
+    """
+    Allows rate acquisitions per second on average and up to burst at once.
+
+    acquire() takes a token right away, letting the count go negative, and
+    then sleeps until that token would have been refilled. Nothing awaits
+    between reading and taking the tokens, so concurrent callers queue up
+    in order without a lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self.waited = 0.0
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """
+    A token bucket per host, shared by every source in the run.
+
+    limits maps host names to {"rate": requests per second, "burst": n}; a
+    limit also applies to subdomains of its host. Other hosts get a bucket
+    of their own with the default limit. A rate of 0 disables limiting.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, float]]] = None,
+        default: Optional[Dict[str, float]] = None,
+    ):
+        self.limits = {
+            host.lower(): limit
+            for host, limit in (
+                DEFAULT_HOST_LIMITS if limits is None else limits
+            ).items()
+        }
+        self.default = DEFAULT_HOST_LIMIT if default is None else default
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+
+    def _limit_for(self, host: str) -> Dict[str, float]:
+        if host in self.limits:
+            return self.limits[host]
+        for limited_host, limit in self.limits.items():
+            if host.endswith("." + limited_host):
+                return limit
+        return self.default
+
+    def bucket(self, host: str) -> Optional[TokenBucket]:
+        host = host.lower()
+        if host not in self._buckets:
+            limit = self._limit_for(host)
+            rate = limit.get("rate", self.default.get("rate", 0))
+            self._buckets[host] = (
+                TokenBucket(rate, limit.get("burst", 1)) if rate > 0 else None
+            )
+        return self._buckets[host]
+
+    async def acquire(self, url: str):
+        """Wait until a request to url's host may be sent."""
+        bucket = self.bucket(urlparse(url).hostname or "")
+        if bucket is not None:
+            await bucket.acquire()
+
+    def stats(self) -> Dict[str, float]:
+        """Seconds spent waiting per host, for hosts that had to wait."""
+        return {
+            host: round(bucket.waited, 1)
+            for host, bucket in self._buckets.items()
+            if bucket is not None and bucket.waited
+        }
+
+
+def configure_rate_limits(rate_limits: Optional[Dict[str, Any]]):
+    """
+    Set per-host limits from the "rate_limits" config section. The shared
+    limiter is recreated on the next get_rate_limiter().
+    """
+    global _limiter, _limits_config
+    _limits_config = rate_limits or {}
+    _limiter = None
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    global _limiter
+    if _limiter is None:
+        limits = dict(DEFAULT_HOST_LIMITS)
+        limits.update(_limits_config.get("hosts", {}))
+        _limiter = HostRateLimiter(
+            limits, dict(DEFAULT_HOST_LIMIT, **_limits_config.get("default", {}))
+        )
+    return _limiter
@@ -0,0 +1,255 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+DEFAULT_LOCAL_STATE_DIR = "local/state"
+DEFAULT_S3_STATE_PREFIX = "state/"
+
+_s3_clients: Dict[Optional[str], Any] = {}
+_s3_clients_lock = threading.Lock()
+# State that may only be saved once the digest has been delivered
+_deferred_state: Dict[str, Tuple[Optional[Dict[str, Any]], Any]] = {}
+
+
+def _get_s3_client(region: Optional[str]):
+    # boto3.client() isn't thread-safe, and state is read from worker threads
+    with _s3_clients_lock:
+        if region not in _s3_clients:
+            _s3_clients[region] = boto3.client("s3", region_name=region)
+        return _s3_clients[region]
+
+
+def _state_config(global_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    global_config = global_config or {}
+    state_config = dict(global_config.get("state") or {})
+    if "backend" not in state_config:
+        state_config["backend"] = "s3" if global_config.get("s3") else "local"
+    return state_config
+
+
+def load_state(
+    global_config: Optional[Dict[str, Any]], key: str, default: Any = None
+) -> Any:
+    """
+    Load a JSON state object persisted by a previous run.
+
+    State lives in the S3 bucket from the "s3" config when it's available,
+    otherwise in a local directory. The "state" config can override this with
+    backend ("s3" or "local"), prefix and dir.
+
+    Args:
+        global_config: Global configuration
+        key: Relative path of the state object, e.g. "feeds/<hash>.json"
+        default: Returned if the object doesn't exist or can't be read
+
+    Returns:
+        The decoded JSON object or default
+    """
+    state_config = _state_config(global_config)
+    try:
+        if state_config["backend"] == "s3":
+            s3_config = (global_config or {})["s3"]
+            s3 = _get_s3_client(s3_config.get("region"))
+            response = s3.get_object(
+                Bucket=s3_config["bucket"],
+                Key=state_config.get("prefix", DEFAULT_S3_STATE_PREFIX) + key,
+            )
+            return json.loads(response["Body"].read().decode("utf-8"))
+
+        path = os.path.join(state_config.get("dir", DEFAULT_LOCAL_STATE_DIR), key)
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            print(f"ERROR: Failed to load state {key}: {str(e)}")
+        return default
+    except Exception as e:
+        print(f"ERROR: Failed to load state {key}: {str(e)}")
+        return default
+
+
+def save_state(global_config: Optional[Dict[str, Any]], key: str, data: Any) -> bool:
+    """
+    Persist a JSON state object for the next run. See load_state().
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    state_config = _state_config(global_config)
+    try:
+        body = json.dumps(data)
+        if state_config["backend"] == "s3":
+            s3_config = (global_config or {})["s3"]
+            s3 = _get_s3_client(s3_config.get("region"))
+            s3.put_object(
+                Bucket=s3_config["bucket"],
+                Key=state_config.get("prefix", DEFAULT_S3_STATE_PREFIX) + key,
+                Body=body,
+                ContentType="application/json",
+            )
+            return True
+
+        path = os.path.join(state_config.get("dir", DEFAULT_LOCAL_STATE_DIR), key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so a crash never leaves half a file behind
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"ERROR: Failed to save state {key}: {str(e)}")
+        return False
+
+
+def defer_state(global_config: Optional[Dict[str, Any]], key: str, data: Any):
+    """
+    Stage a state object that must only be persisted once the digest has been
+    delivered, such as "seen up to here" cursors. It is saved by
+    commit_deferred_state(); a later defer_state() of the same key replaces it.
+    """
+    _deferred_state[key] = (global_config, data)
+
+
+def commit_deferred_state() -> bool:
+    """
+    Save the state staged with defer_state(). Call after the digest has been
+    mailed or uploaded.
+
+    Returns:
+        bool: True if everything was saved
+    """
+    saved = True
+    for key, (global_config, data) in list(_deferred_state.items()):
+        if save_state(global_config, key, data):
+            del _deferred_state[key]
+        else:
+            saved = False
+    return saved
+
+
+def discard_deferred_state():
+    """Drop state staged by an earlier digest that was never delivered."""
+    _deferred_state.clear()
+
+
+class PersistentCache:
+    """
+    Key/value cache persisted between runs as a single state object.
+
+    Entries expire after their TTL; on save, expired entries are dropped and
+    the least recently used ones are evicted down to max_entries. Keys must
+    be strings and values JSON-serializable. Call load() before use and
+    save() at the end of the run.
+    """
+
+    def __init__(
+        self,
+        global_config: Optional[Dict[str, Any]],
+        key: str,
+        max_entries: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+    ):
+        self.global_config = global_config
+        self.key = key
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = False
+
+    def load(self) -> "PersistentCache":
+        data = load_state(self.global_config, self.key, default={}) or {}
+        self.entries = data.get("entries", {})
+        self._dirty = False
+        return self
+
+    def save(self) -> bool:
+        self.evict()
+        if not self._dirty:
+            return True
+        saved = save_state(self.global_config, self.key, {"entries": self.entries})
+        if saved:
+            self._dirty = False
+        return saved
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return entry.get("expires_at") is not None and entry["expires_at"] <= now
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None or self._is_expired(entry, now):
+            self.misses += 1
+            return default
+        self.hits += 1
+        entry["accessed_at"] = now
+        self._dirty = True
+        return entry["value"]
+
+    def is_fresh(self, key: str) -> bool:
+        """Whether get() would hit, without touching stats or recency."""
+        entry = self.entries.get(key)
+        return entry is not None and not self._is_expired(entry, time.time())
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Return a value even if it has expired, without touching stats or recency."""
+        entry = self.entries.get(key)
+        return default if entry is None else entry["value"]
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        expires_at: Optional[float] = None,
+    ):
+        now = time.time()
+        if expires_at is None:
+            ttl = self.default_ttl if ttl is None else ttl
+            expires_at = now + ttl if ttl is not None else None
+        self.entries[key] = {
+            "value": value,
+            "stored_at": now,
+            "accessed_at": now,
+            "expires_at": expires_at,
+        }
+        self._dirty = True
+
+    def delete(self, key: str):
+        if self.entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def evict(self):
+        now = time.time()
+        expired = [k for k, e in self.entries.items() if self._is_expired(e, now)]
+        for k in expired:
+            del self.entries[k]
+        evicted = len(expired)
+
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            by_recency = sorted(
+                self.entries, key=lambda k: self.entries[k]["accessed_at"]
+            )
+            for k in by_recency[: len(self.entries) - self.max_entries]:
+                del self.entries[k]
+                evicted += 1
+
+        if evicted:
+            self.evictions += evicted
+            self._dirty = True
+
+    def stats(self) -> str:
+        return (
+            f"{self.key}: {self.hits} hit(s), {self.misses} miss(es), "
+            f"{self.evictions} eviction(s), {len(self.entries)} entries"
+        )
@@ -0,0 +1,46 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SYNC_WORKERS = 4
+
+_executor: ThreadPoolExecutor | None = None
+_max_workers = DEFAULT_SYNC_WORKERS
+
+
+def configure_sync_pool(max_workers: int):
+    """
+    Set the size of the thread pool used for blocking work.
+    An existing pool of a different size is replaced on the next run_sync().
+    """
+    global _executor, _max_workers
+    if _executor is not None and max_workers != _max_workers:
+        _executor.shutdown(wait=False)
+        _executor = None
+    _max_workers = max_workers
+
+
+def get_sync_pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=_max_workers, thread_name_prefix="sync-pool"
+        )
+    return _executor
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Run a blocking function in the shared thread pool without blocking the event loop.
+
+    Args:
+        func: Synchronous function to call
+        *args, **kwargs: Arguments passed to func
+
+    Returns:
+        Whatever func returns
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_sync_pool(), functools.partial(func, *args, **kwargs)
+    )
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark the article main-content extraction backends.
+
+Runs every backend over a directory of stored article HTML files (see
+ai.store_articles_dir), then reports throughput and how often each backend's
+output matches the BeautifulSoup reference.
+
+Usage:
+    python scripts/benchmark_extraction.py local/articles --repeat 3
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from news_digest.core.extraction import EXTRACTION_BACKENDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction backends")
+    parser.add_argument("directory", help="Directory with stored article .html files")
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Times to run each backend"
+    )
+    parser.add_argument(
+        "--backends",
+        type=str,
+        default=",".join(EXTRACTION_BACKENDS),
+        help="Comma-separated list of backends to compare",
+    )
+    args = parser.parse_args()
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(args.directory, "*.html"))):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            documents.append((path, f.read()))
+    if not documents:
+        print(f"No .html files found in {args.directory}")
+        return 1
+    total_mb = sum(len(d.encode("utf-8")) for _, d in documents) / 1024 / 1024
+    print(f"{len(documents)} documents, {total_mb:.2f} MB")
+
+    reference = [EXTRACTION_BACKENDS["bs4"](d) for _, d in documents]
+
+    print(
+        f"{'backend':<10} {'seconds':>9} {'docs/s':>9} {'MB/s':>8} {'matches':>12} {'errors':>7}"
+    )
+    for backend in args.backends.split(","):
+        extract = EXTRACTION_BACKENDS[backend]
+        try:
+            extract(documents[0][1])
+        except ImportError as e:
+            print(f"{backend:<10} skipped: {e}")
+            continue
+        except Exception:
+            pass
+
+        errors = 0
+        outputs = []
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            outputs = []
+            errors = 0
+            for path, document in documents:
+                try:
+                    outputs.append(extract(document))
+                except Exception:
+                    errors += 1
+                    outputs.append(None)
+        elapsed = time.perf_counter() - start
+
+        matches = sum(1 for a, b in zip(outputs, reference) if a == b)
+        runs = len(documents) * args.repeat
+        print(
+            f"{backend:<10} {elapsed:>9.3f} {runs / elapsed:>9.1f} "
+            f"{total_mb * args.repeat / elapsed:>8.2f} "
+            f"{f'{matches}/{len(documents)}':>12} {errors:>7}"
+        )
+        for (path, _), a, b in zip(documents, outputs, reference):
+            if a is not None and a != b:
+                print(f"  differs from bs4: {path} ({len(a)} vs {len(b)} chars)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 from news_digest.core.handler import gen_digest
 from news_digest.core.handler import mail_digest
 from news_digest.core.handler import upload_digest
+from news_digest.core.handler import preview_reddit_schedule
+from news_digest.utils.state import commit_deferred_state
 from pathlib import Path
 from datetime import datetime
 
@@ -20,6 +22,8 @@ async def inner_lambda_handler(event, context):
     digest = await gen_digest(s3_path)
     mail_digest(digest)
     upload_digest(digest, s3_path)
+    # E.g. Telegram cursors, only now that the digest has been delivered
+    commit_deferred_state()
 
 
 async def main():
@@ -38,6 +42,16 @@ async def main():
         type=str,
         help="Comma-separated list of subreddits to include (only works with reddit source)",
     )
+    parser.add_argument(
+        "--refresh-subscriptions",
+        action="store_true",
+        help="Re-fetch the Reddit subscription list instead of using the cached one",
+    )
+    parser.add_argument(
+        "--preview-reddit-schedule",
+        action="store_true",
+        help="Print the per-day load of monthly subreddits for this month and exit",
+    )
     parser.add_argument("--output", "-o", type=str, help="Output file path")
     parser.add_argument(
         "--skip-lms",
@@ -46,6 +60,10 @@ async def main():
     )
     args = parser.parse_args()
 
+    if args.preview_reddit_schedule:
+        await preview_reddit_schedule()
+        return
+
     try:
         s3_path = (
             "news-digests/" + datetime.now().strftime("%Y-%m-%d-%H-%M-%S") + ".html"
@@ -81,6 +99,8 @@ async def main():
             source_options = {}
             if args.subreddits:
                 source_options["subreddits"] = args.subreddits.split(",")
+            if args.refresh_subscriptions:
+                source_options["refresh_subscriptions"] = True
             digest = await gen_digest(
                 s3_path, source_name=args.source, source_options=source_options
             )
@@ -116,6 +136,12 @@ async def main():
             upload_digest(digest, s3_path)
         else:
             print("Skipping uploading")
+
+        if args.mail or args.upload:
+            commit_deferred_state()
+        else:
+            # A digest that was only written to a file doesn't advance cursors
+            print("Not delivered, skipping deferred state")
     finally:
         # Unload LMS model only if it was loaded (i.e., in --gen mode and not skipped)
         if args.gen and not args.skip_lms:
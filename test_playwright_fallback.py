@@ -1,35 +1,44 @@
 #!/usr/bin/env python3
 """
-Test script to verify Playwright with fallback to requests functionality.
-This script tests the chess player info fetching with both methods.
+Test script to verify fetching chess player pages over HTTP and with Playwright.
+This script fetches a player page once per method, the way the digest does.
 """
 
 import sys
 import os
 import asyncio
+import time
+
+import aiohttp
 
 # Add the project root to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from news_digest.core.chess_players import _get_player_info
+from news_digest.core.browser_pool import DEFAULT_USER_AGENT, BrowserPool
+from news_digest.core.chess_players import (
+    DEFAULT_BROWSER_ALLOWED_HOSTS,
+    DEFAULT_BROWSER_BLOCKED_RESOURCE_TYPES,
+    HTTP_TIMEOUT_SECONDS,
+    PlayerPageFetcher,
+    _has_player_page_markers,
+)
 
+PLAYER_URL = "https://www.365chess.com/players/{}"
 
-async def test_player_fetch(player_name: str):
-    """Test fetching player info with Playwright and fallback."""
-    print(f"\n{'='*60}")
-    print(f"Testing fetch for player: {player_name}")
-    print(f"{'='*60}")
 
+async def test_player_fetch(fetcher: PlayerPageFetcher, player_name: str) -> bool:
+    """Fetch one player page with fetcher and check it has what the digest reads."""
+    url = PLAYER_URL.format(player_name.replace(" ", "_"))
     try:
-        html_content = await _get_player_info(player_name)
+        html_content = await fetcher.fetch(url, player_name)
         print(f"✓ Successfully fetched player info")
         print(f"  Content length: {len(html_content)} characters")
 
         # Basic validation
-        if "365chess" in html_content.lower():
-            print(f"  ✓ Content appears to be from 365chess.com")
+        if _has_player_page_markers(html_content):
+            print(f"  ✓ Page has the games table and ratings")
         else:
-            print(f"  ⚠ Content might not be from 365chess.com")
+            print(f"  ⚠ Page lacks the games table or ratings")
 
         return True
     except Exception as e:
@@ -43,22 +52,44 @@ async def main():
     print("Chess Player Info Fetch Test")
     print("=" * 60)
     print("\nThis script tests:")
-    print("  1. Playwright fetch (primary method)")
-    print("  2. Requests fallback (if Playwright fails)")
-    print("  3. Local cache (in non-production mode)")
+    print("  1. HTTP first, escalating to Playwright if the page lacks content")
+    print("  2. Playwright first (a host remembered as needing the browser)")
     print("\n")
 
     # Test with a well-known player
     test_players = [
         "Magnus_Carlsen",
     ]
+    # fetch_methods as kept in the state store: empty means HTTP first
+    methods = {
+        "HTTP first": {},
+        "Playwright first": {
+            "www.365chess.com": {"method": "browser", "since": time.time()}
+        },
+    }
 
     success_count = 0
-    total_count = len(test_players)
-
-    for player in test_players:
-        if await test_player_fetch(player):
-            success_count += 1
+    total_count = len(test_players) * len(methods)
+
+    async with (
+        BrowserPool(
+            allowed_hosts=DEFAULT_BROWSER_ALLOWED_HOSTS,
+            blocked_resource_types=DEFAULT_BROWSER_BLOCKED_RESOURCE_TYPES,
+        ) as pool,
+        aiohttp.ClientSession(
+            headers={"User-Agent": DEFAULT_USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS),
+        ) as session,
+    ):
+        for method, fetch_methods in methods.items():
+            fetcher = PlayerPageFetcher({}, pool, session, fetch_methods)
+            for player in test_players:
+                print(f"\n{'='*60}")
+                print(f"Testing fetch for player: {player} ({method})")
+                print(f"{'='*60}")
+                if await test_player_fetch(fetcher, player):
+                    success_count += 1
+            print(f"  Player pages: {fetcher.stats()}")
 
     print(f"\n{'='*60}")
     print(f"Test Results: {success_count}/{total_count} successful")
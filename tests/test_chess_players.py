@@ -0,0 +1,99 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from news_digest.core import chess_players
+from news_digest.core.chess_players import (
+    RatingHistoryCache,
+    next_rating_period,
+    rating_history_expires_at,
+)
+
+
+def timestamp(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+class TestRatingHistoryExpiry(unittest.TestCase):
+    def test_next_rating_period(self):
+        self.assertEqual(
+            next_rating_period(datetime(2025, 9, 17, tzinfo=timezone.utc)),
+            datetime(2025, 10, 1, tzinfo=timezone.utc),
+        )
+        self.assertEqual(
+            next_rating_period(datetime(2025, 12, 31, 23, tzinfo=timezone.utc)),
+            datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+
+    def test_current_list_expires_next_period(self):
+        now = timestamp(2025, 9, 2)
+        expires_at = rating_history_expires_at([{"date": "2025-09"}], now)
+        self.assertEqual(expires_at, timestamp(2025, 10, 1))
+
+    def test_missing_list_retried_early_in_month(self):
+        now = timestamp(2025, 9, 2)
+        expires_at = rating_history_expires_at(
+            [{"date": "2025-08"}], now, publish_grace_days=7, retry_hours=12
+        )
+        self.assertEqual(expires_at, now + 12 * 3600)
+
+    def test_missing_list_after_grace_expires_next_period(self):
+        now = timestamp(2025, 9, 20)
+        expires_at = rating_history_expires_at([{"date": "2025-06"}], now)
+        self.assertEqual(expires_at, timestamp(2025, 10, 1))
+
+
+class TestRatingHistoryCache(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.global_config = {"state": {"backend": "local", "dir": self.state_dir.name}}
+        self.fetched = []
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    async def fake_history(self, fide_id, session):
+        self.fetched.append(fide_id)
+        await asyncio.sleep(0.01)
+        return [{"date": datetime.now(timezone.utc).strftime("%Y-%m")}]
+
+    async def run_once(self, players):
+        cache = RatingHistoryCache(self.global_config, {}, session=None)
+        await cache.load()
+        cache.prefetch(list(players))
+        histories = {}
+        for player, fide_id in players.items():
+            cache.remember_player(player, fide_id)
+            histories[player] = await cache.get(fide_id)
+        await cache.close()
+        await cache.save()
+        return histories
+
+    def test_prefetch_and_reuse_between_runs(self):
+        players = {"Carlsen Magnus": "1503014", "Firouzja Alireza": "12573981"}
+        with mock.patch.object(chess_players, "_get_rating_history", self.fake_history):
+            first = asyncio.run(self.run_once(players))
+            self.assertEqual(sorted(self.fetched), sorted(players.values()))
+
+            second = asyncio.run(self.run_once(players))
+        self.assertEqual(first, second)
+        # Both histories came from the state store on the second run
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_prefetch_known_players_only_once(self):
+        cache = RatingHistoryCache(self.global_config, {}, session=None)
+        cache.remember_player("Carlsen Magnus", "1503014")
+
+        async def run():
+            cache.prefetch(["Carlsen Magnus", "Unknown Player"])
+            return await cache.get("1503014")
+
+        with mock.patch.object(chess_players, "_get_rating_history", self.fake_history):
+            self.assertIsNotNone(asyncio.run(run()))
+        self.assertEqual(self.fetched, ["1503014"])
+
+
+if __name__ == "__main__":
+    unittest.main()
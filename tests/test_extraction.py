@@ -0,0 +1,46 @@
+import unittest
+
+from news_digest.core.extraction import (
+    extract_main_content,
+    extract_main_content_bs4,
+    extract_main_content_stream,
+)
+
+
+class TestExtractMainContent(unittest.TestCase):
+    PAGES = [
+        # Article wins over an earlier <main>
+        """<html><body><main>Main text</main><article>Article <b>text</b></article></body></html>""",
+        # Removed elements inside the container are skipped
+        """<html><body><div class="post-content">Intro<nav>Menu</nav><script>var x = "<p>";</script> body &amp; more</div></body></html>""",
+        # Selector matches inside removed elements don't count
+        """<html><body><aside><div id="content">Sidebar</div></aside><div class="x content y">Real</div></body></html>""",
+        # Unclosed tags end with their parent
+        """<html><body><div role="main"><p>One<p>Two<span>Three</div>After</body></html>""",
+        # Falls back to the body
+        """<html><body><p>Just a page</p><footer>Footer</footer></body></html>""",
+        # No body at all
+        """<p>Fragment</p>""",
+    ]
+
+    def test_stream_matches_bs4(self):
+        for page in self.PAGES:
+            with self.subTest(page=page):
+                self.assertEqual(
+                    extract_main_content_stream(page), extract_main_content_bs4(page)
+                )
+
+    def test_article_text(self):
+        page = self.PAGES[0]
+        self.assertEqual(extract_main_content(page), "Article text")
+        self.assertEqual(extract_main_content(page, backend="bs4"), "Article text")
+
+    def test_unknown_backend_falls_back_to_bs4(self):
+        self.assertEqual(
+            extract_main_content(self.PAGES[1], backend="missing"),
+            "Intro body & more",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from news_digest.core.hn_api import COMMENT_TTL, item_cache_ttl
+
+NOW = 1_750_000_000
+DAY = 86400
+
+
+class TestItemCacheTtl(unittest.TestCase):
+    def test_comments_outlive_a_daily_run(self):
+        comment = {"type": "comment", "time": NOW - 3 * 3600}
+        self.assertEqual(item_cache_ttl(comment, NOW), COMMENT_TTL)
+        self.assertGreater(item_cache_ttl(comment, NOW), DAY)
+
+    def test_comment_in_edit_window_expires_when_it_closes(self):
+        comment = {"type": "comment", "time": NOW - 1800}
+        self.assertEqual(item_cache_ttl(comment, NOW), 5400)
+
+    def test_fresh_stories_are_refreshed_every_run(self):
+        for age in (600, 5 * 3600, 2 * DAY):
+            story = {"type": "story", "time": NOW - age}
+            self.assertLess(item_cache_ttl(story, NOW), DAY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import time
+import unittest
+
+from news_digest.utils.rate_limit import HostRateLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        delays = [bucket.reserve() for _ in range(5)]
+        self.assertEqual(delays[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(delays[3], 0.1, delta=0.01)
+        self.assertAlmostEqual(delays[4], 0.2, delta=0.01)
+
+    def test_concurrent_acquires_are_spaced(self):
+        async def run():
+            bucket = TokenBucket(rate=20, burst=1)
+            start = time.monotonic()
+            await asyncio.gather(*[bucket.acquire() for _ in range(5)])
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(run())
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(elapsed, 0.5)
+
+
+class TestHostRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.limiter = HostRateLimiter(
+            {"example.com": {"rate": 1, "burst": 2}, "fast.org": {"rate": 0}},
+            default={"rate": 5, "burst": 1},
+        )
+
+    def test_limits_apply_to_subdomains(self):
+        self.assertEqual(self.limiter.bucket("www.example.com").burst, 2)
+        self.assertEqual(self.limiter.bucket("EXAMPLE.com").burst, 2)
+        self.assertEqual(self.limiter.bucket("notexample.com").rate, 5)
+
+    def test_hosts_have_separate_buckets(self):
+        self.assertIsNot(self.limiter.bucket("a.net"), self.limiter.bucket("b.net"))
+        self.assertIs(self.limiter.bucket("a.net"), self.limiter.bucket("a.net"))
+
+    def test_zero_rate_disables_limiting(self):
+        self.assertIsNone(self.limiter.bucket("fast.org"))
+
+        async def run():
+            for _ in range(100):
+                await self.limiter.acquire("https://fast.org/item")
+
+        asyncio.run(run())
+        self.assertEqual(self.limiter.stats(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from news_digest.core import reddit
+from news_digest.core.reddit import (
+    assign_monthly_days,
+    fetch_multireddit_batch,
+    gen_subreddit_digests,
+    get_submissions_per_subreddit,
+    group_subreddits_for_batching,
+)
+
+
+class TestAssignMonthlyDays(unittest.TestCase):
+    def setUp(self):
+        self.names = [f"subreddit{i}" for i in range(120)]
+        self.config = {
+            "overrides": {
+                name: {"submissions_per_subreddit": 10} for name in self.names[:20]
+            },
+            "submissions_per_subreddit": 5,
+        }
+        self.days = [1, 4, 8, 11, 15, 18, 22, 25]
+
+    def loads(self, assignment):
+        loads = {day: 0 for day in self.days}
+        for name, day in assignment.items():
+            loads[day] += get_submissions_per_subreddit(self.config, name)
+        return loads
+
+    def test_balanced_load_is_bounded(self):
+        assignment = assign_monthly_days(self.config, self.names, self.days)
+        self.assertEqual(set(assignment), set(self.names))
+
+        total = sum(self.loads(assignment).values())
+        capacity = total * 1.1 / len(self.days) + 1
+        self.assertLessEqual(max(self.loads(assignment).values()), capacity)
+
+    def test_assignment_does_not_depend_on_order(self):
+        self.assertEqual(
+            assign_monthly_days(self.config, self.names, self.days),
+            assign_monthly_days(self.config, self.names[::-1], self.days),
+        )
+
+    def test_adding_a_subreddit_moves_few_others(self):
+        before = assign_monthly_days(self.config, self.names, self.days)
+        after = assign_monthly_days(self.config, self.names + ["new"], self.days)
+        moved = [name for name in self.names if before[name] != after[name]]
+        self.assertLessEqual(len(moved), len(self.names) // 10)
+
+    def test_hash_scheduler(self):
+        config = dict(self.config, monthly_scheduler="hash")
+        assignment = assign_monthly_days(config, self.names, self.days)
+        self.assertTrue(set(assignment.values()) <= set(self.days))
+
+
+def make_submission(subreddit, score):
+    return SimpleNamespace(
+        id=f"{subreddit}-{score}",
+        score=score,
+        created_utc=time.time() - 3600,
+        subreddit=SimpleNamespace(display_name=subreddit),
+    )
+
+
+class FakeListing:
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    async def top(self, time_filter, limit):
+        names = {n.lower() for n in self.name.split("+")}
+        submissions = sorted(
+            (
+                s
+                for s in self.session.submissions
+                if s.subreddit.display_name.lower() in names
+            ),
+            key=lambda s: -s.score,
+        )
+        for submission in submissions[:limit]:
+            yield submission
+
+
+class FakeReddit:
+    """Serves top listings for single subreddits and a+b+c multireddits."""
+
+    def __init__(self, submissions, fail_multireddit=False):
+        self.submissions = submissions
+        self.fail_multireddit = fail_multireddit
+        self.requested = []
+
+    async def subreddit(self, name):
+        self.requested.append(name)
+        if self.fail_multireddit and "+" in name:
+            raise RuntimeError("listing failed")
+        return FakeListing(self, name)
+
+
+class TestMultiredditBatching(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            "overrides": {},
+            "frequency": "day",
+            "submissions_per_subreddit": 2,
+            "showself": [],
+            "fetch_mode": "batched",
+        }
+        # Listed lowercase by Reddit, configured with other cases
+        self.submissions = [make_submission("alpha", 100 - i) for i in range(10)]
+        self.submissions += [make_submission("BETA", 10), make_submission("beta", 9)]
+        self.submissions += [make_submission("gamma", 1)]
+
+    def test_group_subreddits_for_batching(self):
+        config = dict(
+            self.config,
+            overrides={"weekly1": {"frequency": "week"}},
+            multireddit_batch_size=2,
+        )
+        batches = group_subreddits_for_batching(
+            config, ["a", "All", "b", "c", "weekly1", "all"]
+        )
+        # r/all is left out, and a batch of one is fetched on its own
+        self.assertEqual(batches, [("day", ["a", "b"])])
+
+    def test_unfilled_quota_is_left_for_a_per_subreddit_fetch(self):
+        config = dict(self.config, multireddit_limit_per_subreddit=2)
+        session = FakeReddit(self.submissions)
+        result = asyncio.run(
+            fetch_multireddit_batch(session, config, "day", ["Alpha", "Beta"])
+        )
+        # The listing hit its limit of 4 with alpha's posts only
+        self.assertEqual(list(result), ["Alpha"])
+        self.assertEqual([s.score for s in result["Alpha"]], [100, 99])
+
+    def test_exhausted_listing_returns_every_subreddit(self):
+        session = FakeReddit(self.submissions)
+        result = asyncio.run(
+            fetch_multireddit_batch(session, self.config, "day", ["Gamma", "Delta"])
+        )
+        self.assertEqual(list(result), ["Gamma", "Delta"])
+        self.assertEqual([s.score for s in result["Gamma"]], [1])
+        self.assertEqual(result["Delta"], [])
+
+    def test_listing_error_returns_nothing(self):
+        session = FakeReddit(self.submissions, fail_multireddit=True)
+        result = asyncio.run(
+            fetch_multireddit_batch(session, self.config, "day", ["Alpha", "Beta"])
+        )
+        self.assertEqual(result, {})
+
+    def digests(self, session, config, subreddits):
+        def submission_digest(config, subreddit_name, submission):
+            return submission.id
+
+        with mock.patch.object(reddit, "gen_submission_digest", submission_digest):
+            return asyncio.run(gen_subreddit_digests(session, config, subreddits))
+
+    def test_unfilled_subreddits_are_fetched_one_by_one_in_order(self):
+        config = dict(self.config, multireddit_limit_per_subreddit=1)
+        session = FakeReddit(self.submissions)
+        digests = self.digests(session, config, ["Beta", "Alpha", "Gamma"])
+
+        # alpha's top posts fill the listing's limit of 3; the others are
+        # fetched on their own
+        self.assertEqual(session.requested, ["Beta+Alpha+Gamma", "Beta", "Gamma"])
+        self.assertEqual(len(digests), 3)
+        self.assertIn("/r/Beta", digests[0])
+        self.assertIn("BETA-10", digests[0])
+        self.assertIn("/r/Alpha", digests[1])
+        self.assertIn("alpha-100", digests[1])
+        self.assertIn("/r/Gamma", digests[2])
+
+    def test_failed_listing_falls_back_to_per_subreddit_fetches(self):
+        session = FakeReddit(self.submissions, fail_multireddit=True)
+        digests = self.digests(session, self.config, ["Alpha", "Beta"])
+        self.assertEqual(session.requested, ["Alpha+Beta", "Alpha", "Beta"])
+        self.assertIn("/r/Alpha", digests[0])
+        self.assertIn("/r/Beta", digests[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
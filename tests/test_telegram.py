@@ -1,13 +1,26 @@
+import asyncio
+import tempfile
 import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
 from unittest.mock import Mock
 import telethon.tl.types
+import random
 import sys
 import os
+import time
 
 # Add the project root to the path so we can import the module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from news_digest.core.telegram import format_telegram_message
+from news_digest.core import telegram
+from news_digest.core.telegram import (
+    fetch_channel_history,
+    format_telegram_message,
+    gen_telegram_channel_digest,
+)
+from news_digest.utils import state
 
 
 class TestFormatTelegramMessage(unittest.TestCase):
@@ -85,5 +98,296 @@ class TestFormatTelegramMessage(unittest.TestCase):
         self.assertEqual(result, expected)
 
 
+def utf16_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def render_in_utf16(message, entities):
+    """
+    Reference renderer: inserts tags straight into the UTF-16 encoded
+    message, last entity first. Only valid for properly nested entities.
+    """
+    units = message.encode("utf-16-le")
+    inserts = []
+    for order, entity in enumerate(entities):
+        start, end = entity.offset * 2, (entity.offset + entity.length) * 2
+        if entity.__class__ is telethon.tl.types.MessageEntityBold:
+            tags = ("<b>", "</b>")
+        elif entity.__class__ is telethon.tl.types.MessageEntityItalic:
+            tags = ("<i>", "</i>")
+        else:
+            tags = (f"<a href='{entity.url}'>", "</a>")
+        # Closing tags go before opening ones at the same position, inner
+        # entities close before outer ones
+        inserts.append((end, 0, -start, -order, tags[1]))
+        inserts.append((start, 1, -end, order, tags[0]))
+    for position, *_rest, tag in sorted(inserts, reverse=True):
+        units = units[:position] + tag.encode("utf-16-le") + units[position:]
+    return units.decode("utf-16-le").replace("\n", "<br>\n")
+
+
+def nested_entities(rng, start, end, depth=0):
+    """Random properly nested, non-empty entities within [start, end)."""
+    entities = []
+    position = start
+    while depth < 3 and position < end - 1:
+        a = rng.randint(position, end - 1)
+        b = rng.randint(a + 1, end)
+        kind = rng.choice(["bold", "italic", "url"])
+        if kind == "bold":
+            entity = Mock(__class__=telethon.tl.types.MessageEntityBold)
+        elif kind == "italic":
+            entity = Mock(__class__=telethon.tl.types.MessageEntityItalic)
+        else:
+            entity = Mock(
+                url=f"https://example.com/{a}",
+                __class__=telethon.tl.types.MessageEntityTextUrl,
+            )
+        entity.offset, entity.length = a, b - a
+        entities.append(entity)
+        entities += nested_entities(rng, a, b, depth + 1)
+        position = b + rng.randint(0, 5)
+    return entities
+
+
+def emoji_heavy_post(rng, words):
+    tokens = ["word", "слово", "🎙️", "😀", "👍🏽", "✹", "\n", "🇺🇦", "a"]
+    message = " ".join(rng.choice(tokens) for _ in range(words))
+    # Entity boundaries always fall on character boundaries
+    boundaries = [0]
+    for char in message:
+        boundaries.append(boundaries[-1] + utf16_len(char))
+    return message, boundaries
+
+
+class TestFormatTelegramMessageRenderer(unittest.TestCase):
+    def make_post(self, message, entities):
+        post = Mock()
+        post.message = message
+        post.entities = entities
+        return post
+
+    def test_matches_utf16_reference_on_emoji_heavy_posts(self):
+        """The renderer agrees with tag insertion done directly in UTF-16."""
+        rng = random.Random(42)
+        for _ in range(200):
+            message, boundaries = emoji_heavy_post(rng, rng.randint(1, 60))
+            entities = nested_entities(rng, 0, len(boundaries) - 1)
+            # nested_entities works in characters, Telegram in UTF-16 units
+            for entity in entities:
+                end = boundaries[entity.offset + entity.length]
+                entity.offset = boundaries[entity.offset]
+                entity.length = end - entity.offset
+            with self.subTest(message=message):
+                self.assertEqual(
+                    format_telegram_message(self.make_post(message, entities)),
+                    render_in_utf16(message, entities),
+                )
+
+    def test_overlapping_entities_stay_well_formed(self):
+        message = "😀 bold both italic"
+        entities = [
+            Mock(offset=3, length=9, __class__=telethon.tl.types.MessageEntityBold),
+            Mock(offset=8, length=11, __class__=telethon.tl.types.MessageEntityItalic),
+        ]
+        self.assertEqual(
+            format_telegram_message(self.make_post(message, entities)),
+            "😀 <b>bold <i>both</i></b><i> italic</i>",
+        )
+
+    def test_emojis_without_entities_are_unchanged(self):
+        message = "😀😀 a😀\n👍🏽"
+        self.assertEqual(
+            format_telegram_message(self.make_post(message, [])),
+            "😀😀 a😀<br>\n👍🏽",
+        )
+
+    def test_long_post_renders_in_linear_time(self):
+        """Benchmark: a long, emoji-heavy post with thousands of entities."""
+        rng = random.Random(7)
+        message, boundaries = emoji_heavy_post(rng, 40000)
+        entities = []
+        for i in range(0, len(boundaries) - 10, 20):
+            entities.append(
+                Mock(
+                    offset=boundaries[i],
+                    length=boundaries[i + 10] - boundaries[i],
+                    __class__=telethon.tl.types.MessageEntityBold,
+                )
+            )
+        post = self.make_post(message, entities)
+
+        start = time.perf_counter()
+        result = format_telegram_message(post)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(result.count("<b>"), len(entities))
+        self.assertLess(elapsed, 1.0)
+
+
+def make_message(message_id, hours_ago):
+    return SimpleNamespace(
+        id=message_id,
+        date=datetime.now().astimezone() - timedelta(hours=hours_ago),
+        message=f"message {message_id}",
+        entities=None,
+        action=None,
+        audio=None,
+        gif=None,
+        sticker=None,
+        video=None,
+        video_note=None,
+        voice=None,
+        poll=None,
+        photo=None,
+    )
+
+
+class FakeHistoryClient:
+    """Answers GetHistoryRequest from a list of messages, newest first."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.requests = []
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        page = [
+            m
+            for m in self.messages
+            if m.id > request.min_id
+            and (request.offset_id == 0 or m.id < request.offset_id)
+        ][: request.limit]
+        return SimpleNamespace(messages=page, users=[])
+
+
+def make_chat(chat_id=1):
+    return SimpleNamespace(id=chat_id, title="Chat", username=None)
+
+
+class TestFetchChannelHistory(unittest.TestCase):
+    def test_quiet_chat_takes_one_request_and_passes_min_id(self):
+        client = FakeHistoryClient([make_message(i, 1) for i in range(20, 10, -1)])
+        messages, _ = asyncio.run(
+            fetch_channel_history({}, client, make_chat(), 1, min_id=15)
+        )
+        self.assertEqual([m.id for m in messages], [20, 19, 18, 17, 16])
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(client.requests[0].min_id, 15)
+
+    def test_pages_back_until_the_day_cutoff(self):
+        # One message per hour, the last day is covered by the third page
+        client = FakeHistoryClient([make_message(100 - i, i) for i in range(100)])
+        config = {"history_page_size": 10}
+        messages, _ = asyncio.run(fetch_channel_history(config, client, make_chat(), 1))
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual([r.offset_id for r in client.requests], [0, 91, 81])
+        self.assertEqual(len(messages), 30)
+
+    def test_stops_after_max_history_pages(self):
+        client = FakeHistoryClient([make_message(100 - i, 0) for i in range(100)])
+        config = {"history_page_size": 10, "max_history_pages": 2}
+        messages, _ = asyncio.run(fetch_channel_history(config, client, make_chat(), 1))
+        self.assertEqual(len(client.requests), 2)
+        self.assertEqual(len(messages), 20)
+
+
+class TestChannelCursors(unittest.TestCase):
+    config = {
+        "except_chat_ids": [],
+        "channels": [],
+        "no_media": [],
+        "user_cache": "no",
+    }
+
+    def test_cursor_advances_to_newest_message(self):
+        client = FakeHistoryClient([make_message(i, 1) for i in range(30, 20, -1)])
+        cursors = {"1": 25}
+        text = asyncio.run(
+            gen_telegram_channel_digest(self.config, client, make_chat(), cursors)
+        )
+        self.assertEqual(client.requests[0].min_id, 25)
+        self.assertIn("5 item(s)", text)
+        self.assertEqual(cursors, {"1": 30})
+
+    def test_cursor_kept_without_new_messages(self):
+        client = FakeHistoryClient([make_message(i, 1) for i in range(30, 20, -1)])
+        cursors = {"1": 30}
+        text = asyncio.run(
+            gen_telegram_channel_digest(self.config, client, make_chat(), cursors)
+        )
+        self.assertEqual(text, "")
+        self.assertEqual(cursors, {"1": 30})
+
+
+class FakeTelegramClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def iter_dialogs(self):
+        for dialog in []:
+            yield dialog
+
+
+class FakeSessionStore:
+    fail_save = False
+
+    def __init__(self, global_config, config):
+        pass
+
+    def restore(self, path):
+        return path
+
+    def save(self, path):
+        if self.fail_save:
+            raise RuntimeError("save failed")
+        return True
+
+
+class TestDeferredCursors(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.global_config = {"state": {"backend": "local", "dir": self.state_dir.name}}
+        self.config = {
+            "api_id": 1,
+            "api_hash": "hash",
+            "channels": [],
+            "user_cache": "no",
+        }
+        patches = [
+            mock.patch.object(telegram, "TelegramClient", FakeTelegramClient),
+            mock.patch.object(telegram, "TelegramSessionStore", FakeSessionStore),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        state.discard_deferred_state()
+        self.addCleanup(state.discard_deferred_state)
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def run_digest(self):
+        return asyncio.run(
+            telegram.gen_telegram_digest(self.config, global_config=self.global_config)
+        )
+
+    def test_cursors_staged_after_a_successful_run(self):
+        self.run_digest()
+        self.assertIn(telegram.CURSORS_STATE_KEY, state._deferred_state)
+
+    def test_cursors_not_staged_when_a_late_step_fails(self):
+        with mock.patch.object(FakeSessionStore, "fail_save", True):
+            with self.assertRaises(RuntimeError):
+                self.run_digest()
+        self.assertNotIn(telegram.CURSORS_STATE_KEY, state._deferred_state)
+
+
 if __name__ == "__main__":
     unittest.main()
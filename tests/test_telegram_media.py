@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from news_digest.core.telegram_media import (
+    InlineImageProcessor,
+    MediaDownloadScheduler,
+)
+
+
+def make_post(post_id, photo_id):
+    return SimpleNamespace(
+        id=post_id,
+        photo=SimpleNamespace(id=photo_id),
+        file=SimpleNamespace(ext=".jpg"),
+    )
+
+
+class FakeClient:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.downloads = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def download_media(self, post, file, thumb=None):
+        self.downloads.append((post.photo.id, thumb))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return f"photo-{post.photo.id}-{thumb}".encode("utf-8")
+
+
+class FailingMediaStore:
+    available = True
+    base_url = None
+
+    def __init__(self):
+        self.attempts = 0
+
+    def lookup(self, photo_key):
+        return None
+
+    async def store(self, photo_key, blob, ext, mime):
+        self.attempts += 1
+        raise RuntimeError("put_object failed")
+
+
+class TestMediaDownloadScheduler(unittest.TestCase):
+    def test_fill_downloads_each_photo_once_with_bounded_concurrency(self):
+        client = FakeClient()
+        scheduler = MediaDownloadScheduler(client, {"max_concurrent_downloads": 3})
+        text = ""
+        for i in range(60):
+            # 12 distinct photos, each referenced by 5 posts (forwards)
+            text += f"<p>post {i}</p>"
+            text += scheduler.add(make_post(i, i % 12), 1, "image/jpeg", "inline")
+        # Same photo with another thumb size is a different download
+        text += scheduler.add(make_post(60, 0), 0, "image/jpeg", "inline")
+
+        result = asyncio.run(scheduler.fill(text))
+        self.assertEqual(len(client.downloads), 13)
+        self.assertEqual(len(set(client.downloads)), 13)
+        self.assertEqual(client.max_in_flight, 3)
+
+        self.assertNotIn("telegram-media", result)
+        self.assertEqual(result.count("<img"), 61)
+        # Placeholders are replaced in place
+        self.assertTrue(result.startswith("<p>post 0</p><img"))
+
+    def test_placeholders_of_a_retried_chat_are_not_fetched(self):
+        client = FakeClient()
+        scheduler = MediaDownloadScheduler(client, {})
+        # First attempt at the chat, discarded after a flood wait
+        scheduler.add(make_post(1, 100), 1, "image/jpeg", "inline")
+        scheduler.add(make_post(2, 200), 1, "image/jpeg", "inline")
+        # The retry renders the chat again, only its output is kept
+        text = scheduler.add(make_post(1, 100), 1, "image/jpeg", "inline")
+
+        result = asyncio.run(scheduler.fill(text))
+        self.assertEqual(client.downloads, [(100, 1)])
+        self.assertEqual(result.count("<img"), 1)
+
+    def test_text_without_placeholders_is_unchanged(self):
+        client = FakeClient()
+        scheduler = MediaDownloadScheduler(client, {})
+        scheduler.add(make_post(1, 100), 1, "image/jpeg", "inline")
+        self.assertEqual(asyncio.run(scheduler.fill("<p>text</p>")), "<p>text</p>")
+        self.assertEqual(client.downloads, [])
+
+
+class TestMediaStoreFailures(unittest.TestCase):
+    def test_failed_upload_falls_back_to_inline(self):
+        media_store = FailingMediaStore()
+        processor = InlineImageProcessor({"image_processing": {"enabled": "no"}})
+        scheduler = MediaDownloadScheduler(FakeClient(), {}, media_store, processor)
+        text = scheduler.add(make_post(1, 10), 1, "image/jpeg", "store")
+        text += scheduler.add(make_post(2, 20), 1, "image/jpeg", "inline")
+
+        result = asyncio.run(scheduler.fill(text))
+        self.assertEqual(media_store.attempts, 1)
+        self.assertEqual(result.count("data:image/jpeg;base64"), 2)
+
+    def test_failed_upload_over_budget_links_to_post(self):
+        media_store = FailingMediaStore()
+        processor = InlineImageProcessor(
+            {"image_processing": {"enabled": "no"}, "inline_image_budget_kb": 0}
+        )
+        scheduler = MediaDownloadScheduler(FakeClient(), {}, media_store, processor)
+        text = scheduler.add(
+            make_post(1, 10), 1, "image/jpeg", "store", "https://t.me/c/1/1"
+        )
+
+        result = asyncio.run(scheduler.fill(text))
+        self.assertIn("https://t.me/c/1/1", result)
+        self.assertNotIn("telegram-media", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
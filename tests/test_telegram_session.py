@@ -0,0 +1,183 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from news_digest.core import telegram_session
+from news_digest.core.telegram_session import TelegramSessionStore
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 client calls the store makes."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+        self.puts = []
+        self.fail_uploads = False
+        self.fail_downloads = False
+
+    def _missing(self, operation):
+        return ClientError({"Error": {"Code": "NoSuchKey"}}, operation)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self._missing("GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body.encode("utf-8")
+        self.puts.append((Key, kwargs))
+
+    def download_file(self, Bucket, Key, Filename):
+        if self.fail_downloads:
+            raise EndpointConnectionError(endpoint_url="https://s3.example.com")
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        with open(Filename, "wb") as f:
+            f.write(self.objects[(Bucket, Key)])
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        if self.fail_uploads:
+            raise S3UploadFailedError("Failed to upload: Access Denied")
+        with open(Filename, "rb") as f:
+            self.objects[(Bucket, Key)] = f.read()
+        self.uploads.append((Key, ExtraArgs))
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def make_session(path, auth_key):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE sessions (auth_key BLOB)")
+    connection.execute("INSERT INTO sessions VALUES (?)", (auth_key,))
+    connection.commit()
+    connection.close()
+
+
+class TestTelegramSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.bundled = os.path.join(self.dir.name, "bundled.session")
+        make_session(self.bundled, b"bundled")
+        self.path = os.path.join(self.dir.name, "session_name.session")
+        self.s3 = FakeS3()
+        self.config = {
+            "session_store": {"enabled": "yes", "bucket": "private", "versions": 3}
+        }
+        patches = [
+            mock.patch.object(telegram_session, "_get_s3_client", lambda r: self.s3),
+            mock.patch.object(telegram_session, "BUNDLED_SESSION_PATH", self.bundled),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def store(self):
+        return TelegramSessionStore({"s3": {"bucket": "digests"}}, self.config)
+
+    def auth_key(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute("SELECT auth_key FROM sessions").fetchone()[0]
+        finally:
+            connection.close()
+
+    def save_version(self, auth_key):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        make_session(self.path, auth_key)
+        self.assertTrue(self.store().save(self.path))
+        return json.loads(self.s3.objects[("private", "telegram/session/latest.json")])
+
+    def test_disabled_by_default_and_without_bucket(self):
+        self.assertFalse(TelegramSessionStore({"s3": {"bucket": "b"}}, {}).enabled)
+        config = {"session_store": {"enabled": "yes"}}
+        self.assertFalse(TelegramSessionStore({"s3": {"bucket": "b"}}, config).enabled)
+        # The digest bucket needs an explicit prefix
+        config = {"session_store": {"enabled": "yes", "bucket": "b"}}
+        self.assertFalse(TelegramSessionStore({"s3": {"bucket": "b"}}, config).enabled)
+
+    def test_restore_falls_back_past_bad_versions(self):
+        self.save_version(b"older")
+        pointer = self.save_version(b"newer")
+        newest, older = pointer["versions"][:2]
+
+        # Newest version no longer matches its checksum
+        self.s3.objects[("private", newest["key"])] = b"truncated"
+        # A version with a valid checksum that isn't a session database
+        garbage = b"not a database" * 100
+        bad_db = {
+            "key": "telegram/session/versions/garbage.session",
+            "sha256": hashlib.sha256(garbage).hexdigest(),
+        }
+        self.s3.objects[("private", bad_db["key"])] = garbage
+        pointer["versions"].insert(0, bad_db)
+        self.s3.objects[("private", "telegram/session/latest.json")] = json.dumps(
+            pointer
+        ).encode("utf-8")
+
+        self.assertEqual(self.store().restore(self.path), older["key"])
+        self.assertEqual(self.auth_key(), b"older")
+
+    def test_restore_uses_bundled_session_without_good_versions(self):
+        self.assertEqual(self.store().restore(self.path), self.bundled)
+        self.assertEqual(self.auth_key(), b"bundled")
+
+    def test_unchanged_session_is_not_uploaded_again(self):
+        self.save_version(b"key")
+        self.assertEqual(len(self.s3.uploads), 1)
+
+        store = self.store()
+        store.restore(self.path)
+        self.assertTrue(store.save(self.path))
+        self.assertEqual(len(self.s3.uploads), 1)
+
+    def test_failed_upload_returns_false(self):
+        make_session(self.path, b"key")
+        self.s3.fail_uploads = True
+        self.assertFalse(self.store().save(self.path))
+        self.assertNotIn(("private", "telegram/session/latest.json"), self.s3.objects)
+        self.assertFalse(os.path.exists(f"{self.path}.snapshot"))
+
+    def test_restore_falls_back_on_s3_and_pointer_errors(self):
+        pointer_key = ("private", "telegram/session/latest.json")
+        stored = self.save_version(b"stored")["versions"][0]
+
+        # Connection errors while downloading
+        self.s3.fail_downloads = True
+        self.assertEqual(self.store().restore(self.path), self.bundled)
+        self.assertEqual(self.auth_key(), b"bundled")
+        self.s3.fail_downloads = False
+
+        # A pointer that isn't valid JSON
+        self.s3.objects[pointer_key] = b"{not json"
+        self.assertEqual(self.store().restore(self.path), self.bundled)
+
+        # A version entry without its checksum
+        self.s3.objects[pointer_key] = json.dumps(
+            {"versions": [{"key": stored["key"]}]}
+        ).encode("utf-8")
+        self.assertEqual(self.store().restore(self.path), self.bundled)
+
+    def test_uploads_are_encrypted(self):
+        self.save_version(b"key")
+        _, extra_args = self.s3.uploads[0]
+        self.assertEqual(extra_args["ServerSideEncryption"], "AES256")
+        _, put_args = self.s3.puts[0]
+        self.assertEqual(put_args["ServerSideEncryption"], "AES256")
+
+
+if __name__ == "__main__":
+    unittest.main()